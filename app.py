@@ -15,7 +15,7 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 # Mail configuration
 app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', '587'))
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
 app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'admin@nikitarasoi.com')
@@ -23,10 +23,34 @@ app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'admin
 # Initialize extensions
 mail = Mail(app)
 
+# Outbound email is sent from a background thread
+from mailer import MailDispatcher
+mail_dispatcher = MailDispatcher(app, mail)
+
 # Initialize data store
-from data_store import init_data_store
+from data_store import init_data_store, catalog_versions
 init_data_store()
 
+# Rendered anonymous catalog pages, invalidated through catalog_versions
+from page_cache import PageCache
+page_cache = PageCache(catalog_versions, max_entries=int(os.environ.get('PAGE_CACHE_SIZE', '512')))
+
+# Server-side sessions: the cookie holds only a session id. SESSION_BACKEND=cookie
+# keeps Flask's signed cookie sessions
+from sessions import create_session_interface
+session_interface = create_session_interface()
+if session_interface is not None:
+    app.session_interface = session_interface
+
+# Fingerprinted, precompressed CSS and JS; ASSET_PIPELINE=off serves the sources as-is
+from assets import build_assets
+asset_manifest = {}
+if os.environ.get('ASSET_PIPELINE', 'on').lower() != 'off':
+    try:
+        asset_manifest = build_assets(app.static_folder)
+    except OSError as e:
+        logging.warning(f"Asset build failed ({e}); serving unbuilt static files")
+
 # Import routes
 from routes import *
 
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Build fingerprinted, minified and precompressed copies of the site's CSS and
+JavaScript into static/dist, with a manifest mapping source names to them.
+
+    python assets.py
+
+The app also runs the build at startup, so this is only needed to check the
+output or to build ahead of deployment.
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import mimetypes
+from flask import request, send_file, abort
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip copies are built
+    brotli = None
+
+ASSETS = ('css/style.css', 'js/main.js', 'js/cart.js')
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+# Fingerprinted names change whenever their content does, so browsers may
+# keep them for good and never revalidate
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(text):
+    """Strip comments and insignificant whitespace from a stylesheet"""
+    text = _CSS_COMMENT_RE.sub('', text)
+    text = _CSS_SPACE_RE.sub(' ', text)
+    text = _CSS_PUNCT_RE.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    """Strip indentation, blank lines and whole-line comments from a script.
+
+    Line breaks are kept, so automatic semicolon insertion and the contents
+    of strings and regular expressions are left alone.
+    """
+    lines = []
+    in_comment = False
+    for line in text.splitlines():
+        line = line.strip()
+        if in_comment:
+            in_comment = '*/' not in line
+            continue
+        if line.startswith('/*'):
+            in_comment = '*/' not in line
+            continue
+        if not line or line.startswith('//'):
+            continue
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write(path, data):
+    # Workers may build at the same time; a rename never leaves a partial file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_folder):
+    """Build every asset that changed and write the manifest; returns {source name: built name}"""
+    manifest = {}
+    for name in ASSETS:
+        stem, ext = os.path.splitext(name)
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            data = MINIFIERS[ext](f.read()).encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()[:10]
+        built = f"{DIST_DIR}/{stem}.{digest}{ext}"
+        manifest[name] = built
+
+        path = os.path.join(static_folder, built)
+        if os.path.exists(path):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data, quality=11))
+        _write(path, data)
+
+    _write(os.path.join(static_folder, DIST_DIR, MANIFEST), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+
+def send_asset(static_folder, filename):
+    """Serve a built asset, precompressed to suit the client's Accept-Encoding"""
+    path = safe_join(os.path.join(static_folder, DIST_DIR), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0]
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    response = send_file(path, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+if __name__ == '__main__':
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    for source, built in build_assets(static_folder).items():
+        sizes = [os.path.getsize(os.path.join(static_folder, source))]
+        for suffix in ('', '.gz', '.br'):
+            path = os.path.join(static_folder, built + suffix)
+            sizes.append(os.path.getsize(path) if os.path.exists(path) else None)
+        print(f"{source} -> {built}: " + ', '.join(
+            f"{label} {size:,} B" for label, size in zip(('source', 'minified', 'gzip', 'brotli'), sizes)
+            if size is not None))
+    if brotli is None:
+        print("brotli is not installed; built gzip copies only", file=sys.stderr)
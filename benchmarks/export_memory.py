@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Stream an admin order export over a large synthetic order history and check
+that memory stays within a fixed budget while it runs.
+
+    python benchmarks/export_memory.py --orders 1000000 --budget-mb 32
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import resource
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('ASSET_PIPELINE', 'off')
+logging.disable(logging.WARNING)
+
+from app import app
+import routes  # noqa: F401  registers the export endpoint
+from models import Order, OrderItem, User
+from data_store import data_store, insert_order, insert_user, get_next_id
+
+STATUSES = ['pending', 'confirmed', 'preparing', 'delivered', 'cancelled']
+
+
+def rss_bytes():
+    """Current resident set size; falls back to the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def make_orders(count, rng):
+    users = []
+    for i in range(1000):
+        user = User(get_next_id('user_id'), f"bench{i}", f"bench{i}@example.com", 'x')
+        insert_user(user)
+        users.append(user.id)
+    products = list(data_store['products'].values())
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / count
+    for i in range(count):
+        items = [OrderItem(0, product.id, rng.randint(1, 4), product.price)
+                 for product in rng.sample(products, rng.randint(1, 3))]
+        insert_order(Order(get_next_id('order_id'), rng.choice(users),
+                           sum(item.quantity * item.price for item in items),
+                           f"{rng.randint(1, 999)} Baker Street, Pune", status=rng.choice(STATUSES),
+                           items=items, created_at=start + step * i))
+
+
+def run_export(client, url):
+    baseline = rss_bytes()
+    peak = baseline
+    size = chunks = 0
+    first_byte = None
+    start = time.perf_counter()
+    response = client.get(url, buffered=False)
+    for chunk in response.response:
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+        size += len(chunk)
+        chunks += 1
+        if chunks % 16 == 0:
+            peak = max(peak, rss_bytes())
+    response.close()
+    elapsed = time.perf_counter() - start
+    return size, first_byte, elapsed, max(peak, rss_bytes()) - baseline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--budget-mb', type=float, default=32.0,
+                        help='Allowed RSS growth while an export streams')
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    start = time.perf_counter()
+    make_orders(args.orders, rng)
+    print(f"orders:        {args.orders:,} (built in {time.perf_counter() - start:.1f} s, "
+          f"RSS {rss_bytes() / 2**20:.0f} MB)")
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = 1  # the seeded admin
+
+    over_budget = False
+    for label, url in (('csv', '/admin/export/orders'),
+                       ('ndjson', '/admin/export/orders?format=ndjson'),
+                       ('csv.gz', '/admin/export/orders?gzip=1'),
+                       ('delivered', '/admin/export/orders?status=delivered')):
+        size, first_byte, elapsed, growth = run_export(client, url)
+        over_budget |= growth > args.budget_mb * 2**20
+        print(f"{label:<10} {size / 2**20:8.1f} MB in {elapsed:5.1f} s "
+              f"({size / 2**20 / elapsed:5.1f} MB/s), first byte {first_byte * 1000:.1f} ms, "
+              f"RSS growth {growth / 2**20:.1f} MB")
+
+    if over_budget:
+        print(f"FAIL: RSS grew by more than {args.budget_mb:.0f} MB during an export")
+        sys.exit(1)
+    print(f"OK: every export stayed within {args.budget_mb:.0f} MB of RSS growth")
+
+
+if __name__ == '__main__':
+    main()
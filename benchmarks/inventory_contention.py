@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Hammer one hot product with concurrent checkouts and check that stock is
+never oversold and no decrement is lost.
+
+    python benchmarks/inventory_contention.py --checkouts 500 --stock 200
+    python benchmarks/inventory_contention.py --app   # through /place_order
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+logging.disable(logging.CRITICAL)
+
+from app import app
+from data_store import data_store, get_next_id, insert_product, insert_user, get_category_by_name
+from inventory import reserve_stock, InsufficientStockError
+from models import Product, User
+
+
+def make_product(stock):
+    product = Product(get_next_id('product_id'), 'Hot Croissant', 'Benchmark item', 99.0,
+                      get_category_by_name('Pastries').id, '', stock=stock)
+    insert_product(product)
+    return product
+
+
+def checkout_engine(hot, cold, index):
+    # Every checkout takes the hot product plus one of a few others, so
+    # multi-item reservations contend as well
+    try:
+        reserve_stock([(hot.id, 1), (cold[index % len(cold)].id, 1)])
+        return True
+    except InsufficientStockError:
+        return False
+
+
+def make_app_checkout(hot, cold):
+    app.config['TESTING'] = True
+    app.config['MAIL_SUPPRESS_SEND'] = True
+
+    def checkout(index):
+        user = User(get_next_id('user_id'), f'bench{index}', f'bench{index}@example.com', 'x')
+        insert_user(user)
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+            session['cart'] = {
+                str(hot.id): {'quantity': 1, 'price': hot.price, 'name': hot.name},
+                str(cold[index % len(cold)].id): {'quantity': 1, 'price': 10.0, 'name': 'cold'},
+            }
+        response = client.post('/place_order', data={'new_address': 'Bench Street',
+                                                      'payment_method': 'cash_on_delivery'})
+        return '/order/' in response.headers.get('Location', '')
+
+    return checkout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--checkouts', type=int, default=500)
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--app', action='store_true', help='Check out through the Flask app instead of the engine')
+    args = parser.parse_args()
+
+    # Switch threads far more often than usual to provoke interleavings
+    sys.setswitchinterval(1e-6)
+
+    hot = make_product(args.stock)
+    cold = [make_product(args.checkouts) for _ in range(4)]
+    cold_before = sum(p.stock for p in cold)
+    orders_before = len(data_store['orders'])
+    if args.app:
+        checkout = make_app_checkout(hot, cold)
+    else:
+        checkout = lambda index: checkout_engine(hot, cold, index)
+
+    results = [None] * args.checkouts
+    barrier = threading.Barrier(args.checkouts)
+
+    def worker(index):
+        barrier.wait()
+        results[index] = checkout(index)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.checkouts)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(1 for r in results if r)
+    expected = min(args.stock, args.checkouts)
+    cold_taken = cold_before - sum(p.stock for p in cold)
+    print(f"checkouts:        {args.checkouts} concurrent ({'app' if args.app else 'engine'})")
+    print(f"succeeded:        {succeeded} (expected {expected})")
+    print(f"hot stock left:   {hot.stock} (expected {args.stock - expected})")
+    print(f"cold units taken: {cold_taken} (expected {succeeded})")
+    if args.app:
+        print(f"orders created:   {len(data_store['orders']) - orders_before} (expected {succeeded})")
+    print(f"throughput:       {args.checkouts / elapsed:,.0f} checkouts/s")
+
+    ok = (succeeded == expected and hot.stock == args.stock - expected and hot.stock >= 0
+          and cold_taken == succeeded)
+    print('OK: no oversells or lost decrements' if ok else 'FAILED: stock is inconsistent')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+"""
+Load-test the storefront and admin pages with weighted user scenarios and
+report throughput and p50/p95/p99 latency per endpoint.
+
+    python benchmarks/load_test.py --scale small --iterations 2000
+    python benchmarks/load_test.py --target gunicorn --workers 4 --concurrency 16 --duration 30
+    python benchmarks/load_test.py --output after.json --baseline before.json
+    python benchmarks/load_test.py --compare after.json --baseline before.json
+
+--target client runs the app in this process through the Flask test client,
+with the memory storage and session backends. --target gunicorn seeds a
+SQLite store in a temporary directory and serves it from a locally spawned
+gunicorn with the SQLite session backend. Either way the data is synthetic
+and nothing outside the temporary directory, removed afterwards, is touched.
+
+--output saves the results as JSON. --baseline compares them against an
+earlier run and exits with status 1 if any endpoint's p95 latency, or the
+overall throughput, got worse by more than --tolerance.
+"""
+
+import os
+import re
+import sys
+import json
+import html
+import time
+import random
+import shutil
+import socket
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import http.client
+import importlib.util
+from datetime import datetime, timedelta
+from urllib.parse import urlencode, quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# name -> synthetic data added on top of the seeded sample store
+SCALES = {
+    'small': {'products': 200, 'users': 500, 'orders': 5_000, 'reviews': 2_000},
+    'medium': {'products': 2_000, 'users': 5_000, 'orders': 50_000, 'reviews': 20_000},
+    'large': {'products': 20_000, 'users': 50_000, 'orders': 500_000, 'reviews': 200_000}
+}
+
+PASSWORD = 'loadtest'
+ADMIN = ('admin', 'admin123')  # seeded with the sample data
+STATUSES = ['pending', 'confirmed', 'preparing', 'delivered', 'cancelled']
+FLAVOURS = ['chocolate', 'vanilla', 'almond', 'pistachio', 'cardamom', 'saffron', 'mango', 'strawberry',
+            'cinnamon', 'coffee', 'caramel', 'lemon', 'hazelnut', 'coconut', 'butterscotch', 'honey']
+ITEMS = ['bread', 'loaf', 'croissant', 'muffin', 'cupcake', 'cookie', 'brownie', 'tart', 'cake',
+         'roll', 'bagel', 'danish', 'eclair', 'pie', 'scone', 'donut', 'pastry', 'biscuit', 'rusk']
+ADJECTIVES = ['fresh', 'soft', 'crispy', 'flaky', 'buttery', 'moist', 'rich', 'classic', 'artisan',
+              'homemade', 'glazed', 'frosted', 'toasted', 'premium', 'eggless']
+
+NEXT_PAGE_RE = re.compile(rb'href="(/products\?[^"]*after=[^"]*)"')
+CONFIRM_RE = re.compile(rb'/confirm_payment/(\d+)')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+# -- Data -----------------------------------------------------------------
+
+def configure_environment(target, directory):
+    """Point the app at throwaway storage; must run before the app is imported"""
+    os.environ.pop('DATA_DIR', None)
+    # Confirmation emails fail fast against a closed local port instead of reaching out
+    os.environ['MAIL_SERVER'] = '127.0.0.1'
+    os.environ['MAIL_PORT'] = '9'
+    os.environ['MAIL_USE_TLS'] = 'false'
+    if target == 'gunicorn':
+        os.environ['STORAGE_BACKEND'] = os.environ['SESSION_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(directory, 'store.db')
+        os.environ['SESSION_PATH'] = os.path.join(directory, 'sessions.db')
+    else:
+        os.environ['STORAGE_BACKEND'] = os.environ['SESSION_BACKEND'] = 'memory'
+
+
+def make_data(scale, rng):
+    """Add synthetic products, customers, reviews and orders; returns what the scenarios need"""
+    from werkzeug.security import generate_password_hash
+    from models import Product, User, Review, Order, OrderItem
+    from data_store import (data_store, insert_product, insert_user, insert_review, insert_order, get_next_id,
+                            transaction)
+
+    categories = [category for category in data_store['categories'].values() if category.is_active]
+    password_hash = generate_password_hash(PASSWORD)  # hashed once; every customer shares it
+    with transaction():
+        products = []
+        for _ in range(scale['products']):
+            name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(FLAVOURS).title()} {rng.choice(ITEMS).title()}"
+            product = Product(get_next_id('product_id'), name, f"{name}, baked fresh every morning.",
+                              float(rng.randint(20, 900)), rng.choice(categories).id, '', stock=10 ** 9)
+            insert_product(product)
+            products.append(product)
+
+        customers = []
+        for i in range(scale['users']):
+            user = User(get_next_id('user_id'), f"load{i}", f"load{i}@example.com", password_hash)
+            insert_user(user)
+            customers.append(user)
+
+        for _ in range(scale['reviews']):
+            insert_review(Review(get_next_id('review_id'), rng.choice(products).id, rng.choice(customers).id,
+                                 rng.randint(1, 5), 'Lovely, would order again.'))
+
+        start = datetime.now() - timedelta(days=365)
+        step = timedelta(days=365) / max(1, scale['orders'])
+        for i in range(scale['orders']):
+            items = [OrderItem(0, product.id, rng.randint(1, 4), product.price)
+                     for product in rng.sample(products, rng.randint(1, min(3, len(products))))]
+            insert_order(Order(get_next_id('order_id'), rng.choice(customers).id,
+                               sum(item.quantity * item.price for item in items),
+                               f"{rng.randint(1, 999)} MG Road, Pune", status=rng.choice(STATUSES),
+                               items=items, created_at=start + step * i))
+
+    return {
+        'product_ids': [product.id for product in products],
+        'categories': [category.name for category in categories],
+        'customers': [user.username for user in customers]
+    }
+
+
+# -- Clients --------------------------------------------------------------
+
+class ClientSession:
+    """One browser on the Flask test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, form=None, json_body=None):
+        response = self.client.open(path, method=method, data=form, json=json_body)
+        return response.status_code, response.get_data()
+
+
+class HTTPSession:
+    """One browser over HTTP, keeping its own session cookie"""
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+        self.cookie = None
+
+    def request(self, method, path, form=None, json_body=None):
+        headers = {'Accept-Encoding': 'identity'}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        try:
+            self.conn.request(method, path, body, headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()  # reconnects on the next request
+            raise
+        for header in response.headers.get_all('Set-Cookie') or ():
+            name, _, rest = header.partition('=')
+            if name == 'session':
+                value = rest.split(';', 1)[0]
+                self.cookie = f"session={value}" if value else None
+        return response.status, data
+
+
+class VirtualUser:
+    """Runs scenarios as one visitor, with a guest, a customer and an admin browser"""
+
+    def __init__(self, new_session, world, rng, customer):
+        self.new_session = new_session
+        self.world = world
+        self.rng = rng
+        self.customer = customer
+        self.sessions = {}
+        self.guest_cart = 0
+        self.recording = False
+        self.timings = {}
+        self.errors = {}
+
+    def session(self, role):
+        session = self.sessions.get(role)
+        if session is None:
+            session = self.sessions[role] = self.new_session()
+            if role != 'guest':
+                username, password = ADMIN if role == 'admin' else (self.customer, PASSWORD)
+                self.call('POST /login', session, 'POST', '/login',
+                          form={'username': username, 'password': password})
+        return session
+
+    def call(self, label, session, method, path, form=None, json_body=None):
+        start = time.perf_counter()
+        try:
+            status, body = session.request(method, path, form, json_body)
+        except (OSError, http.client.HTTPException):
+            status, body = None, b''
+        elapsed = time.perf_counter() - start
+        if self.recording:
+            self.timings.setdefault(label, []).append(elapsed)
+            if status is None or status >= 400:
+                self.errors[label] = self.errors.get(label, 0) + 1
+        return status, body
+
+    def get(self, label, path, role='guest'):
+        return self.call(label, self.session(role), 'GET', path)
+
+    def post(self, label, path, role='guest', form=None, json_body=None):
+        return self.call(label, self.session(role), 'POST', path, form, json_body)
+
+    def product_id(self):
+        return self.rng.choice(self.world['product_ids'])
+
+
+# -- Scenarios ------------------------------------------------------------
+
+def browse_catalog(user):
+    user.get('GET /', '/')
+    status, body = user.get('GET /products', '/products')
+    match = NEXT_PAGE_RE.search(body)
+    if match:
+        user.get('GET /products?after=', html.unescape(match.group(1).decode()))
+    user.get('GET /categories', '/categories')
+    user.get('GET /category/<name>', '/category/' + quote(user.rng.choice(user.world['categories'])))
+
+
+def search(user):
+    rng = user.rng
+    word = rng.choice(FLAVOURS + ITEMS)
+    for length in range(3, min(len(word), 5) + 1):  # typeahead while typing
+        user.get('GET /search/suggest', '/search/suggest?q=' + quote(word[:length]))
+    query = word if rng.random() < 0.5 else f"{rng.choice(FLAVOURS)} {rng.choice(ITEMS)}"
+    user.get('GET /products?q=', '/products?' + urlencode({'q': query}))
+
+
+def product_detail(user):
+    user.get('GET /product/<id>', f"/product/{user.product_id()}")
+
+
+def add_to_cart(user):
+    if user.guest_cart >= 8:
+        # A new visitor arrives instead of the cart growing without end
+        user.sessions.pop('guest', None)
+        user.guest_cart = 0
+    product_id = user.product_id()
+    user.get('GET /product/<id>', f"/product/{product_id}")
+    user.post('POST /cart/items', '/cart/items',
+              json_body={'items': [{'product_id': product_id, 'add': user.rng.randint(1, 3)}]})
+    user.guest_cart += 1
+    user.get('GET /cart', '/cart')
+
+
+def _fill_customer_cart(user):
+    items = [{'product_id': user.product_id(), 'add': user.rng.randint(1, 3)}
+             for _ in range(user.rng.randint(1, 4))]
+    user.post('POST /cart/items', '/cart/items', role='customer', json_body={'items': items})
+    user.get('GET /cart', '/cart', role='customer')
+    user.get('GET /checkout', '/checkout', role='customer')
+
+
+def checkout_cod(user):
+    _fill_customer_cart(user)
+    user.post('POST /place_order', '/place_order', role='customer',
+              form={'new_address': '12 MG Road, Pune', 'payment_method': 'cash_on_delivery'})
+
+
+def checkout_qr(user):
+    _fill_customer_cart(user)
+    user.post('POST /place_order', '/place_order', role='customer',
+              form={'new_address': '12 MG Road, Pune', 'payment_method': 'qr_payment'})
+    status, body = user.get('GET /qr_payment', '/qr_payment', role='customer')
+    match = CONFIRM_RE.search(body)
+    if match:
+        user.post('POST /confirm_payment/<id>', f"/confirm_payment/{match.group(1).decode()}", role='customer')
+
+
+def admin_pages(user):
+    user.get('GET /admin', '/admin', role='admin')
+    user.get('GET /admin/orders', '/admin/orders', role='admin')
+    user.get('GET /admin/analytics', '/admin/analytics', role='admin')
+
+
+# name -> (scenario, relative weight)
+SCENARIOS = {
+    'browse catalog': (browse_catalog, 30),
+    'search': (search, 20),
+    'product detail': (product_detail, 20),
+    'add to cart': (add_to_cart, 14),
+    'checkout (COD)': (checkout_cod, 6),
+    'checkout (QR)': (checkout_qr, 4),
+    'admin pages': (admin_pages, 6)
+}
+
+
+# -- Running --------------------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, threads, directory):
+    """Serve main:app from a gunicorn on a free local port; returns (process, port)"""
+    if importlib.util.find_spec('gunicorn') is None:
+        sys.exit("gunicorn is not installed; pip install gunicorn, or use --target client")
+    port = free_port()
+    log = open(os.path.join(directory, 'gunicorn.log'), 'wb')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--threads', str(threads),
+         '--bind', f"127.0.0.1:{port}", 'main:app'],
+        cwd=ROOT, env=os.environ.copy(), stdout=log, stderr=subprocess.STDOUT)
+
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"gunicorn exited with status {process.returncode}; see {log.name}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200:
+                return process, port
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit(f"gunicorn did not start within 120 s; see {log.name}")
+
+
+def run_load(users, iterations, duration, warmup):
+    """Run scenarios on every virtual user in its own thread; returns (measured wall seconds, runs per scenario)"""
+    names = list(SCENARIOS)
+    weights = [SCENARIOS[name][1] for name in names]
+    counts = {name: 0 for name in names}
+    remaining = [iterations]
+    lock = threading.Lock()
+    clock = {}
+
+    def start_clock():
+        clock['start'] = time.perf_counter()
+        clock['deadline'] = clock['start'] + (duration or 0)
+
+    # Measuring starts once every virtual user has finished warming up
+    started = threading.Barrier(len(users) + 1, action=start_clock)
+
+    def worker(user):
+        for _ in range(warmup):
+            SCENARIOS[user.rng.choices(names, weights)[0]][0](user)
+        user.recording = True
+        started.wait()
+        while True:
+            if duration:
+                if time.perf_counter() >= clock['deadline']:
+                    return
+            else:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            name = user.rng.choices(names, weights)[0]
+            SCENARIOS[name][0](user)
+            with lock:
+                counts[name] += 1
+
+    threads = [threading.Thread(target=worker, args=(user,), daemon=True) for user in users]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - clock['start'], counts
+
+
+def summarize(timings, errors, wall):
+    """Latency percentiles (ms) and throughput for one endpoint, or for all of them"""
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'throughput': round(len(timings) / wall, 2) if wall else 0.0,
+        'p50': round(percentile(timings, 0.50) * 1000, 3),
+        'p95': round(percentile(timings, 0.95) * 1000, 3),
+        'p99': round(percentile(timings, 0.99) * 1000, 3),
+        'mean': round(sum(timings) / len(timings) * 1000, 3) if timings else 0.0,
+        'max': round(timings[-1] * 1000, 3) if timings else 0.0
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_report(results):
+    meta = results['meta']
+    print(f"target {meta['target']}, scale {meta['scale_name']} {meta['scale']}, "
+          f"{meta['concurrency']} virtual users, {meta['wall_seconds']:.1f} s")
+    print(f"{'endpoint':<30} {'requests':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}")
+    rows = sorted(results['endpoints'].items()) + [('overall', results['overall'])]
+    for label, stats in rows:
+        print(f"{label:<30} {stats['requests']:>8} {stats['throughput']:>8.1f} {stats['p50']:>8.2f} "
+              f"{stats['p95']:>8.2f} {stats['p99']:>8.2f} {stats['errors']:>6}")
+    print('scenarios: ' + ', '.join(f"{name} {count}" for name, count in results['scenarios'].items()))
+
+
+def compare(results, baseline, tolerance, min_ms):
+    """Print how results differ from a baseline; returns a list of regressions.
+
+    An endpoint regresses when its p95 grows by more than tolerance (a
+    fraction) and by more than min_ms, or when it starts failing; the run
+    regresses when overall throughput drops by more than tolerance.
+    """
+    for key in ('target', 'scale', 'concurrency', 'workers', 'threads'):
+        if results['meta'].get(key) != baseline['meta'].get(key):
+            print(f"note: {key} differs from the baseline ({baseline['meta'].get(key)} -> "
+                  f"{results['meta'].get(key)}), so the comparison is rough")
+
+    regressions = []
+    print(f"{'endpoint':<30} {'base p95':>9} {'p95':>9} {'change':>8}")
+    for label in sorted(set(results['endpoints']) | set(baseline['endpoints'])):
+        current, base = results['endpoints'].get(label), baseline['endpoints'].get(label)
+        if current is None or base is None:
+            print(f"{label:<30} {'only in ' + ('results' if base is None else 'baseline'):>28}")
+            continue
+        change = (current['p95'] - base['p95']) / base['p95'] if base['p95'] else 0.0
+        flag = ''
+        if change > tolerance and current['p95'] - base['p95'] > min_ms:
+            flag = 'SLOWER'
+            regressions.append(f"{label}: p95 {base['p95']:.2f} -> {current['p95']:.2f} ms")
+        elif current['errors'] and not base['errors']:
+            flag = 'ERRORS'
+            regressions.append(f"{label}: {current['errors']} errors, none in the baseline")
+        print(f"{label:<30} {base['p95']:>9.2f} {current['p95']:>9.2f} {change:>+8.0%} {flag}")
+
+    base_rate, rate = baseline['overall']['throughput'], results['overall']['throughput']
+    print(f"overall throughput {base_rate:.1f} -> {rate:.1f} req/s")
+    if base_rate and rate < base_rate * (1 - tolerance):
+        regressions.append(f"throughput {base_rate:.1f} -> {rate:.1f} req/s")
+    return regressions
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', choices=('client', 'gunicorn'), default='client')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    for key in ('products', 'users', 'orders', 'reviews'):
+        parser.add_argument(f"--{key}", type=int, help=f"Override the scale's number of {key}")
+    parser.add_argument('--concurrency', type=int, default=4, help='Virtual users, each in its own thread')
+    parser.add_argument('--iterations', type=int, default=2000, help='Scenarios to run in total')
+    parser.add_argument('--duration', type=float, help='Run for this many seconds instead of --iterations')
+    parser.add_argument('--warmup', type=int, default=10, help='Unmeasured scenarios per virtual user')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Save the results as JSON here')
+    parser.add_argument('--baseline', help='Earlier results JSON to compare against')
+    parser.add_argument('--compare', metavar='RESULTS', help='Compare saved results with --baseline and exit')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown as a fraction')
+    parser.add_argument('--min-ms', type=float, default=1.0,
+                        help='Ignore p95 increases smaller than this, which are mostly noise')
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error('--compare needs --baseline')
+        regressions = compare(load_results(args.compare), load_results(args.baseline), args.tolerance, args.min_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+
+    directory = tempfile.mkdtemp(prefix='load_test_')
+    configure_environment(args.target, directory)
+    logging.disable(logging.WARNING)
+    from app import app
+    import routes  # noqa: F401  registers the views
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    world = make_data(scale, rng)
+    print(f"data: {scale} added in {time.perf_counter() - start:.1f} s ({directory})")
+
+    process = None
+    if args.target == 'gunicorn':
+        process, port = start_gunicorn(args.workers, args.threads, directory)
+        new_session = lambda: HTTPSession('127.0.0.1', port)  # noqa: E731
+    else:
+        app.config['MAIL_SUPPRESS_SEND'] = True
+        new_session = lambda: ClientSession(app)  # noqa: E731
+
+    users = [VirtualUser(new_session, world, random.Random(args.seed * 1000 + i),
+                         world['customers'][i % len(world['customers'])])
+             for i in range(args.concurrency)]
+    try:
+        wall, counts = run_load(users, args.iterations, args.duration, args.warmup)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    endpoints = {}
+    for user in users:
+        for label, timings in user.timings.items():
+            endpoints.setdefault(label, []).extend(timings)
+    errors = {}
+    for user in users:
+        for label, count in user.errors.items():
+            errors[label] = errors.get(label, 0) + count
+
+    results = {
+        'meta': {
+            'target': args.target,
+            'scale_name': args.scale,
+            'scale': scale,
+            'concurrency': args.concurrency,
+            'workers': args.workers if args.target == 'gunicorn' else None,
+            'threads': args.threads if args.target == 'gunicorn' else None,
+            'iterations': sum(counts.values()),
+            'wall_seconds': round(wall, 3),
+            'seed': args.seed,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'started_at': datetime.now().isoformat(timespec='seconds')
+        },
+        'overall': summarize([t for timings in endpoints.values() for t in timings], sum(errors.values()), wall),
+        'scenarios': counts,
+        'endpoints': {label: summarize(timings, errors.get(label, 0), wall) for label, timings in endpoints.items()}
+    }
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"results saved to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.tolerance, args.min_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Drive the background mail dispatcher end to end against a local SMTP
+stand-in, compared with sending each message synchronously.
+
+    python benchmarks/mail_dispatch.py --messages 200 --fail-first 3
+"""
+
+import os
+import sys
+import time
+import argparse
+import threading
+import socketserver
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP to accept mail; can reject the first N transactions"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, fail_first=0, delay=0.0):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.fail_first = fail_first
+        self.delay = delay
+        self.received = 0
+        self.rejected = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost stand-in ready')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith('MAIL FROM'):
+                with server.lock:
+                    reject = server.rejected < server.fail_first
+                    if reject:
+                        server.rejected += 1
+                self.reply('451 try again later' if reject else '250 OK')
+            elif command.startswith(('RCPT TO', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                time.sleep(server.delay)
+                with server.lock:
+                    server.received += 1
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 not implemented')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--fail-first', type=int, default=3, help='Transactions the server rejects before accepting')
+    parser.add_argument('--delay', type=float, default=0.002, help='Simulated server time per message (s)')
+    args = parser.parse_args()
+
+    server = SMTPStandIn(fail_first=args.fail_first, delay=args.delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['MAIL_SERVER'] = '127.0.0.1'
+    os.environ['MAIL_PORT'] = str(server.server_address[1])
+    os.environ['MAIL_USE_TLS'] = 'false'
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    from flask_mail import Message
+    from app import app, mail
+    from mailer import MailDispatcher
+
+    dispatcher = MailDispatcher(app, mail, backoff=0.05)
+    with app.app_context():
+        messages = [Message(subject=f'Order Confirmation - #{i}', recipients=[f'customer{i}@example.com'],
+                            body='Thank you for your order!') for i in range(args.messages)]
+
+        start = time.perf_counter()
+        for message in messages:
+            dispatcher.enqueue(message)
+        enqueue_seconds = time.perf_counter() - start
+        delivered = dispatcher.flush(timeout=60)
+        async_seconds = time.perf_counter() - start
+        stats = dispatcher.get_stats()
+        async_connections = server.connections
+
+        sync_count = min(args.messages, 50)
+        start = time.perf_counter()
+        for message in messages[:sync_count]:
+            mail.send(message)
+        sync_seconds = time.perf_counter() - start
+
+    print(f"messages:            {args.messages}")
+    print(f"enqueue (view cost): {enqueue_seconds / args.messages * 1e6:.1f} us/message")
+    print(f"async delivery:      {async_seconds:.2f} s over {async_connections} SMTP connection(s)")
+    print(f"sync mail.send:      {sync_seconds / sync_count * 1000:.2f} ms/message "
+          f"({sync_count} messages, one connection each)")
+    print(f"dispatcher stats:    {stats}")
+    ok = delivered and stats['sent'] == args.messages and stats['dead_letters'] == 0 \
+        and server.received == args.messages + sync_count
+    print('OK: every message delivered' if ok else 'FAILED: messages missing')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Compare bytes per entity for the slotted models against the dict-backed
+classes they replaced.
+
+    python benchmarks/model_memory.py --rows 100000 1000000
+"""
+
+import os
+import sys
+import argparse
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Order, Review, User, Address
+
+
+# Dict-backed equivalents of the original models
+class LegacyUser:
+    def __init__(self, user_id, username, email, password_hash, is_admin=False, created_at=None):
+        self.id = user_id
+        self.username = username
+        self.email = email
+        self.password_hash = password_hash
+        self.is_admin = is_admin
+        self.created_at = created_at or datetime.now()
+
+
+class LegacyOrder:
+    def __init__(self, order_id, user_id, total, shipping_address, status='pending', items=None, created_at=None):
+        self.id = order_id
+        self.user_id = user_id
+        self.total = float(total)
+        self.shipping_address = shipping_address
+        self.status = status
+        self.created_at = created_at or datetime.now()
+        self.updated_at = self.created_at
+        self.items = items or []
+
+
+class LegacyReview:
+    def __init__(self, review_id, product_id, user_id, rating, comment, created_at=None):
+        self.id = review_id
+        self.product_id = product_id
+        self.user_id = user_id
+        self.rating = int(rating)
+        self.comment = comment
+        self.created_at = created_at or datetime.now()
+
+
+class LegacyAddress:
+    def __init__(self, address_id, user_id, name, street, city, state, zip_code, phone=None, created_at=None):
+        self.id = address_id
+        self.user_id = user_id
+        self.name = name
+        self.street = street
+        self.city = city
+        self.state = state
+        self.zip_code = zip_code
+        self.phone = phone
+        self.created_at = created_at or datetime.now()
+
+
+# Shared strings and timestamps so only per-entity overhead is measured
+NOW = datetime.now()
+HASH = 'pbkdf2:sha256:600000$salt$hash'
+ADDRESS = '12 Baker Street, Pune 411001'
+COMMENT = 'Lovely and fresh'
+
+
+def line_items(i):
+    return [{'product_id': i % 500, 'quantity': 2, 'price': 99.5},
+            {'product_id': (i + 1) % 500, 'quantity': 1, 'price': 149.0}]
+
+
+FACTORIES = {
+    'User': (lambda i: LegacyUser(i, 'user', 'user@example.com', HASH, created_at=NOW),
+             lambda i: User(i, 'user', 'user@example.com', HASH, created_at=NOW)),
+    'Order (2 items)': (lambda i: LegacyOrder(i, i, 348.0, ADDRESS, items=line_items(i), created_at=NOW),
+                        lambda i: Order(i, i, 348.0, ADDRESS, items=line_items(i), created_at=NOW)),
+    'Review': (lambda i: LegacyReview(i, i % 500, i, 5, COMMENT, created_at=NOW),
+               lambda i: Review(i, i % 500, i, 5, COMMENT, created_at=NOW)),
+    'Address': (lambda i: LegacyAddress(i, i, 'Home', ADDRESS, 'Pune', 'MH', '411001', created_at=NOW),
+                lambda i: Address(i, i, 'Home', ADDRESS, 'Pune', 'MH', '411001', created_at=NOW)),
+}
+
+
+def bytes_per_row(factory, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory(i) for i in range(rows)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    # Exclude the 8-byte list slot that holds each object
+    return (after - before) / rows - 8
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'entity':<18}{'rows':>10}{'before B/row':>15}{'after B/row':>14}{'saved':>8}")
+    for name, (legacy, slotted) in FACTORIES.items():
+        for rows in args.rows:
+            before = bytes_per_row(legacy, rows)
+            after = bytes_per_row(slotted, rows)
+            print(f"{name:<18}{rows:>10,}{before:>15.0f}{after:>14.0f}{1 - after / before:>8.0%}")
+
+
+if __name__ == '__main__':
+    main()
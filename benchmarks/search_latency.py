@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Measure product search and typeahead latency on a synthetic catalog.
+
+    python benchmarks/search_latency.py --products 100000 --queries 2000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Product, Category
+from data_store import insert_category
+from search_index import SearchIndex, PrefixSuggester
+
+FLAVOURS = ['chocolate', 'vanilla', 'almond', 'pistachio', 'cardamom', 'saffron', 'mango', 'strawberry',
+            'blueberry', 'cinnamon', 'coffee', 'caramel', 'lemon', 'orange', 'hazelnut', 'coconut',
+            'rose', 'butterscotch', 'walnut', 'honey', 'ginger', 'raisin', 'date', 'fig']
+ITEMS = ['bread', 'loaf', 'croissant', 'muffin', 'cupcake', 'cookie', 'brownie', 'tart', 'cake',
+         'roll', 'bagel', 'danish', 'eclair', 'macaron', 'pie', 'scone', 'donut', 'pastry', 'biscuit', 'rusk']
+CATEGORIES = ['Bread', 'Pastries', 'Muffins', 'Desserts', 'Cakes', 'Cookies', 'Festive', 'Eggless']
+ADJECTIVES = ['fresh', 'soft', 'crispy', 'flaky', 'buttery', 'moist', 'rich', 'light', 'classic',
+              'artisan', 'homemade', 'glazed', 'frosted', 'toasted', 'baked', 'premium', 'eggless']
+
+
+def make_catalog(count, rng):
+    # Products name their category by id; the index reads the name through it
+    for category_id, name in enumerate(CATEGORIES, 1):
+        insert_category(Category(category_id, name))
+    # A long tail of rare words makes the vocabulary realistically large
+    rare = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(5, 9)))
+            for _ in range(20000)]
+    products = []
+    for i in range(1, count + 1):
+        name = f"{rng.choice(ADJECTIVES).title()} {rng.choice(FLAVOURS).title()} {rng.choice(ITEMS).title()}"
+        words = rng.sample(ADJECTIVES, 3) + rng.sample(FLAVOURS, 2) + rng.sample(rare, 6)
+        rng.shuffle(words)
+        description = ' '.join(words) + ', baked fresh every morning.'
+        products.append(Product(i, name, description, 99.0, rng.randint(1, len(CATEGORIES)), '', stock=10))
+    return products, rare
+
+
+def make_queries(count, rng, rare):
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.3:
+            queries.append(f"{rng.choice(FLAVOURS)} {rng.choice(ITEMS)}")
+        elif kind < 0.5:
+            queries.append(f"{rng.choice(ADJECTIVES)} {rng.choice(FLAVOURS)} {rng.choice(ITEMS)}")
+        elif kind < 0.7:
+            word = rng.choice(FLAVOURS + ITEMS)
+            queries.append(word[:rng.randint(3, len(word))])  # typed prefix
+        elif kind < 0.85:
+            queries.append(rng.choice(rare))
+        else:
+            queries.append(f"{rng.choice(ITEMS)}s {rng.choice(CATEGORIES).lower()}")
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--limit', type=int, default=24, help='Results per query (a page); 0 for all')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    products, rare = make_catalog(args.products, rng)
+    index = SearchIndex()
+    start = time.perf_counter()
+    for product in products:
+        index.add(product)
+    build_seconds = time.perf_counter() - start
+
+    queries = make_queries(args.queries, rng, rare)
+    index.search('warm up')
+    limit = args.limit or None
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, limit=limit)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    suggester = PrefixSuggester()
+    for product in products:
+        suggester.add(product.id, product.name, rng.randrange(200))
+    typed = []
+    for _ in range(args.queries):
+        word = rng.choice(FLAVOURS + ITEMS + ADJECTIVES)
+        typed.append(word[:rng.randint(2, len(word))])
+    suggest_timings = []
+    for query in typed:
+        start = time.perf_counter()
+        suggester.suggest(query)
+        suggest_timings.append((time.perf_counter() - start) * 1000)
+    suggest_timings.sort()
+
+    edit = products[0]
+    start = time.perf_counter()
+    for _ in range(1000):
+        index.add(edit)
+    update_us = (time.perf_counter() - start) / 1000 * 1e6
+
+    print(f"products:      {args.products:,} (index built in {build_seconds:.1f} s)")
+    print(f"queries:       {args.queries:,}, limit {limit or 'all'}")
+    print(f"p50 latency:   {statistics.median(timings):.3f} ms")
+    print(f"p95 latency:   {timings[int(len(timings) * 0.95)]:.3f} ms")
+    print(f"p99 latency:   {timings[int(len(timings) * 0.99)]:.3f} ms")
+    print(f"reindex edit:  {update_us:.1f} us/product")
+    print(f"typeahead p50: {statistics.median(suggest_timings) * 1000:.1f} us, "
+          f"p99 {suggest_timings[int(len(suggest_timings) * 0.99)] * 1000:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark the data_store mutation log: append cost on the write path and
+replay time for a large log.
+
+    python benchmarks/wal_replay.py --mutations 1000000
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import persistence
+from models import Order, Review, User
+
+COLLECTIONS = ('users', 'products', 'orders', 'reviews', 'addresses', 'categories')
+
+
+def generate(log, count):
+    """Append a register / review / order mix of mutations, returning seconds spent in append()"""
+    spent = 0.0
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            row = User(i, f'user{i}', f'user{i}@example.com', 'pbkdf2:sha256:x')
+            record = ('put', 'users', i, row)
+        elif kind == 1:
+            row = Review(i, i % 500, i % 1000, 1 + i % 5, 'Lovely and fresh')
+            record = ('put', 'reviews', i, row)
+        elif kind == 2:
+            row = Order(i, i % 1000, 199.0, '12 Baker Street, Pune 411001',
+                        items=[{'product_id': i % 500, 'quantity': 2, 'price': 99.5}])
+            record = ('put', 'orders', i, row)
+        else:
+            record = ('counter', None, 'order_id', i)
+        start = time.perf_counter()
+        log.append(record)
+        spent += time.perf_counter() - start
+    return spent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mutations', type=int, default=1_000_000)
+    parser.add_argument('--dir', help='Data directory to use (default: a temporary directory)')
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='wal-bench-')
+    try:
+        log = persistence.MutationLog(directory, COLLECTIONS)
+        start = time.perf_counter()
+        append_seconds = generate(log, args.mutations)
+        log.close()
+        write_seconds = time.perf_counter() - start
+
+        # Background compaction may have folded sealed segments into the snapshot
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"mutations:            {args.mutations:,}")
+        print(f"on-disk size:         {size / 1024 / 1024:.1f} MiB (snapshot + log)")
+        print(f"append (write path):  {append_seconds / args.mutations * 1e6:.2f} us/mutation")
+        print(f"write + fsync total:  {write_seconds:.2f} s")
+
+        start = time.perf_counter()
+        state = persistence.load_state(directory, COLLECTIONS)
+        replay_seconds = time.perf_counter() - start
+        rows = sum(len(rows) for rows in state['collections'].values())
+        print(f"replay:               {replay_seconds:.2f} s "
+              f"({args.mutations / replay_seconds:,.0f} mutations/s, {rows:,} live rows)")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
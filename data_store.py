@@ -1,6 +1,18 @@
+import os
+import atexit
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta
 from werkzeug.security import generate_password_hash
-from models import User, Product, Order, Review, Address, VisitorLog, Category
+from models import User, Product, Order, Review, Address, Category
+from visitor_stats import VisitorStats, VisitorLogPipeline
+from search_index import SearchIndex, PrefixSuggester
+from pagination import SortedIndex, Page
+from order_stats import OrderStats
+from sales_rollups import SalesRollups
+from page_cache import CatalogVersions
+import storage
 
 # In-memory data storage
 data_store = {
@@ -10,7 +22,9 @@ data_store = {
     'reviews': {},
     'addresses': {},
     'categories': {},
-    'visitor_logs': [],
+    'visitor_stats': VisitorStats(
+        retention_days=int(os.environ.get('VISITOR_RETENTION_DAYS', '30'))
+    ),
     'counters': {
         'user_id': 1,
         'product_id': 1,
@@ -21,8 +35,146 @@ data_store = {
     }
 }
 
+# Request hooks hand visits to this pipeline; a background thread records them
+visitor_pipeline = VisitorLogPipeline(
+    data_store['visitor_stats'],
+    max_queue=int(os.environ.get('VISITOR_QUEUE_SIZE', '100000'))
+)
+
+# Secondary indexes over data_store, maintained by the insert/delete helpers below.
+# Per-owner indexes map owner key -> {row_id: row} so rows can be removed in O(1)
+# while keeping insertion order.
+indexes = {
+    'users_by_username': {},
+    'users_by_email': {},
+    'reviews_by_product': {},
+    'orders_by_user': {},
+    'addresses_by_user': {},
+    'products_by_category': {},  # category id -> {product_id: product}
+    'prices_by_category': {},  # category id -> {price: number of products}
+    'min_price_by_category': {},  # category id -> lowest price, for "starting from"
+    'categories_by_name': {}  # lowercased name -> category
+}
+
+# Full-text index over product name, category and description, kept current
+# by the same hooks as the secondary indexes
+product_search = SearchIndex()
+product_suggest = PrefixSuggester()  # product names for typeahead, ranked by review count
+
+# Catalog change counters that cached catalog pages are validated against
+catalog_versions = CatalogVersions()
+
+# Order count and revenue per status, kept current by the order index hooks
+order_stats = OrderStats()
+sales_rollups = SalesRollups()
+
+# Keyset-paginated listings: listing name -> scope -> SortedIndex of rows in
+# (created_at, id) order. Unscoped listings use the scope None.
+listings = {
+    'users': {},
+    'products': {},
+    'orders': {},
+    'orders_by_status': {},
+    'products_by_category': {},  # scoped by category id
+    'reviews': {},
+    'reviews_by_product': {}
+}
+
+# Collections stored by the storage backend
+PERSISTED_COLLECTIONS = ('users', 'products', 'orders', 'reviews', 'addresses', 'categories')
+
+backend = storage.MemoryBackend()
+
+# Guards the in-memory mirror while applying transactions and remote changes
+_lock = threading.RLock()
+_local = threading.local()
+
 def init_data_store():
-    """Initialize the data store with sample data"""
+    """Load the data store from the configured backend, seeding sample data if it is empty"""
+    global backend
+    backend = storage.create_backend()
+    atexit.register(backend.close)
+    _load_state()
+    if not data_store['users']:
+        with transaction():
+            # Another worker may have seeded the shared store while we waited
+            if not data_store['users']:
+                seed_sample_data()
+
+def _load_state():
+    state = backend.load(PERSISTED_COLLECTIONS)
+    for name in PERSISTED_COLLECTIONS:
+        data_store[name].clear()
+        data_store[name].update(state['collections'][name])
+    data_store['counters'].update(state['counters'])
+    _migrate_product_categories()
+    rebuild_indexes()
+    if data_store['users']:
+        logging.info(f"Loaded data store from {type(backend).__name__}")
+
+def _migrate_product_categories():
+    # Products persisted before categories were referenced by id still hold a
+    # category name; point them at the matching category, creating it if needed
+    legacy = [p for p in data_store['products'].values() if not isinstance(p.category_id, int)]
+    if not legacy:
+        return
+    by_name = {c.name.lower(): c for c in data_store['categories'].values()}
+    for product in legacy:
+        name = product.category_id or 'Uncategorized'
+        category = by_name.get(name.lower())
+        if category is None:
+            category = by_name[name.lower()] = Category(get_next_id('category_id'), name)
+            data_store['categories'][category.id] = category
+            _record('put', 'categories', category.id, category)
+        product.category_id = category.id
+        _record('put', 'products', product.id, product)
+    logging.info(f"Linked {len(legacy)} products to categories by id")
+
+def sync_data_store():
+    """Apply changes committed by other workers sharing the storage backend"""
+    if not backend.shared:
+        return
+    with _lock:
+        records = backend.poll()
+        if records is None:
+            _load_state()
+            return
+        for op, collection, key, value in records:
+            if op == 'put':
+                _apply_put(collection, value)
+            elif key in data_store[collection]:
+                _apply_delete(collection, key)
+
+@contextmanager
+def transaction():
+    """Group the writes made inside the block into one atomic backend transaction.
+
+    With a shared backend the block runs against the latest committed state:
+    other workers' changes are applied first, and the backend holds its write
+    lock until commit. A process-local backend has nothing to sync, so its
+    transactions run concurrently and rely on finer-grained locks such as the
+    per-product locks in inventory. Only the backend write is rolled back on
+    error, not the in-memory objects.
+    """
+    if getattr(_local, 'records', None) is not None:
+        yield
+        return
+    with _lock if backend.shared else nullcontext():
+        backend.begin()
+        _local.records = []
+        try:
+            sync_data_store()
+            yield
+            backend.write(_local.records)
+        except BaseException:
+            _local.records = None
+            backend.rollback()
+            raise
+        _local.records = None
+        backend.commit()
+
+def seed_sample_data():
+    """Populate the data store with sample data"""
     
     # Create admin user
     admin_user = User(
@@ -32,7 +184,7 @@ def init_data_store():
         password_hash=generate_password_hash('admin123'),
         is_admin=True
     )
-    data_store['users'][1] = admin_user
+    insert_user(admin_user)
     data_store['counters']['user_id'] = 2
     
     # Initialize categories
@@ -66,7 +218,7 @@ def init_data_store():
             description=category_data['description'],
             image_url=category_data['image_url']
         )
-        data_store['categories'][i] = category
+        insert_category(category)
     
     data_store['counters']['category_id'] = len(categories_data) + 1
     
@@ -144,31 +296,436 @@ def init_data_store():
             name=product_data['name'],
             description=product_data['description'],
             price=product_data['price'],
-            category=product_data['category'],
+            category_id=get_category_by_name(product_data['category']).id,
             image_url=product_data['image_url'],
             stock=product_data['stock']
         )
-        data_store['products'][i] = product
+        insert_product(product)
     
     data_store['counters']['product_id'] = len(products_data) + 1
+    
+    for counter_name, value in data_store['counters'].items():
+        _record('counter', None, counter_name, value)
 
 def get_next_id(counter_name):
     """Get next available ID for a given counter"""
-    current_id = data_store['counters'][counter_name]
-    data_store['counters'][counter_name] += 1
+    current_id = backend.next_id(counter_name, data_store['counters'][counter_name])
+    data_store['counters'][counter_name] = current_id + 1
+    _record('counter', None, counter_name, current_id + 1)
     return current_id
 
-def add_visitor_log(ip_address, user_agent, page=None):
-    """Add a visitor log entry"""
-    visitor_log = VisitorLog(ip_address, user_agent, page)
-    data_store['visitor_logs'].append(visitor_log)
+def _record(op, collection, key, value=None):
+    # Buffer the mutation for the enclosing transaction, or write it straight
+    # through to the backend.
+    records = getattr(_local, 'records', None)
+    if records is not None:
+        records.append((op, collection, key, value))
+    else:
+        backend.write([(op, collection, key, value)])
+
+def save_row(collection, row):
+    """Record an in-place change to a stored row"""
+    if collection == 'products':
+        catalog_versions.bump_product(row.id)
+    _record('put', collection, row.id, row)
+
+def _index_add(index_name, key, row):
+    indexes[index_name].setdefault(key, {})[row.id] = row
+
+def _index_remove(index_name, key, row_id):
+    bucket = indexes[index_name].get(key)
+    if bucket is not None:
+        bucket.pop(row_id, None)
+        if not bucket:
+            del indexes[index_name][key]
+
+def _listing_add(name, row, scope=None):
+    listing = listings[name].get(scope)
+    if listing is None:
+        listing = listings[name][scope] = SortedIndex()
+    listing.add(row)
+
+def _listing_remove(name, row, scope=None):
+    listing = listings[name].get(scope)
+    if listing is not None:
+        listing.remove(row)
+        if not len(listing):
+            del listings[name][scope]
+
+def _price_add(category_id, price):
+    prices = indexes['prices_by_category'].setdefault(category_id, {})
+    prices[price] = prices.get(price, 0) + 1
+    lowest = indexes['min_price_by_category'].get(category_id)
+    if lowest is None or price < lowest:
+        indexes['min_price_by_category'][category_id] = price
+        catalog_versions.bump_catalog()  # category pages show the starting price
+
+def _price_remove(category_id, price):
+    prices = indexes['prices_by_category'].get(category_id)
+    if not prices or price not in prices:
+        return
+    prices[price] -= 1
+    if prices[price]:
+        return
+    del prices[price]
+    if indexes['min_price_by_category'].get(category_id) == price:
+        # Rescanned only when the last product at the lowest price goes
+        if prices:
+            indexes['min_price_by_category'][category_id] = min(prices)
+        else:
+            del indexes['prices_by_category'][category_id]
+            del indexes['min_price_by_category'][category_id]
+        catalog_versions.bump_catalog()
+
+def _index_row(collection, row):
+    if collection == 'users':
+        indexes['users_by_username'][row.username] = row
+        indexes['users_by_email'][row.email] = row
+        _listing_add('users', row)
+    elif collection == 'products':
+        catalog_versions.bump_product(row.id)
+        _index_add('products_by_category', row.category_id, row)
+        _price_add(row.category_id, row.price)
+        _listing_add('products', row)
+        _listing_add('products_by_category', row, row.category_id)
+        product_search.add(row)
+        row.reset_ratings()
+        for review in indexes['reviews_by_product'].get(row.id, {}).values():
+            row.add_rating(review.rating)
+        product_suggest.add(row.id, row.name, row.review_count)
+    elif collection == 'reviews':
+        _index_add('reviews_by_product', row.product_id, row)
+        _listing_add('reviews', row)
+        _listing_add('reviews_by_product', row, row.product_id)
+        catalog_versions.bump_product(row.product_id)
+        product = data_store['products'].get(row.product_id)
+        if product:
+            product.add_rating(row.rating)
+            product_suggest.add(product.id, product.name, product.review_count)
+    elif collection == 'orders':
+        _index_add('orders_by_user', row.user_id, row)
+        _listing_add('orders', row)
+        _listing_add('orders_by_status', row, row.status)
+        order_stats.add(row)
+        sales_rollups.add(row)
+    elif collection == 'addresses':
+        _index_add('addresses_by_user', row.user_id, row)
+    elif collection == 'categories':
+        catalog_versions.bump_catalog()
+        indexes['categories_by_name'][row.name.lower()] = row
+        # Products are searchable by category name, so a rename reaches only
+        # this category's products
+        for product in indexes['products_by_category'].get(row.id, {}).values():
+            product_search.add(product)
+
+def _unindex_row(collection, row):
+    if collection == 'users':
+        if indexes['users_by_username'].get(row.username) is row:
+            del indexes['users_by_username'][row.username]
+        if indexes['users_by_email'].get(row.email) is row:
+            del indexes['users_by_email'][row.email]
+        _listing_remove('users', row)
+    elif collection == 'products':
+        catalog_versions.bump_product(row.id)
+        _index_remove('products_by_category', row.category_id, row.id)
+        _price_remove(row.category_id, row.price)
+        _listing_remove('products', row)
+        _listing_remove('products_by_category', row, row.category_id)
+        product_search.remove(row.id)
+        product_suggest.remove(row.id)
+    elif collection == 'reviews':
+        _index_remove('reviews_by_product', row.product_id, row.id)
+        _listing_remove('reviews', row)
+        _listing_remove('reviews_by_product', row, row.product_id)
+        catalog_versions.bump_product(row.product_id)
+        product = data_store['products'].get(row.product_id)
+        if product:
+            product.remove_rating(row.rating)
+            product_suggest.add(product.id, product.name, product.review_count)
+    elif collection == 'orders':
+        _index_remove('orders_by_user', row.user_id, row.id)
+        _listing_remove('orders', row)
+        _listing_remove('orders_by_status', row, row.status)
+        order_stats.remove(row)
+        sales_rollups.remove(row)
+    elif collection == 'addresses':
+        _index_remove('addresses_by_user', row.user_id, row.id)
+    elif collection == 'categories':
+        catalog_versions.bump_catalog()
+        if indexes['categories_by_name'].get(row.name.lower()) is row:
+            del indexes['categories_by_name'][row.name.lower()]
+
+def _listing_fields(product):
+    # Product fields that decide which listings and search results show it
+    return (product.name, product.description, product.category_id)
+
+def _apply_put(collection, row):
+    old = data_store[collection].get(row.id)
+    if collection == 'products' and (old is None or _listing_fields(old) != _listing_fields(row)):
+        catalog_versions.bump_catalog()
+    if old is not None:
+        _unindex_row(collection, old)
+    data_store[collection][row.id] = row
+    _index_row(collection, row)
+
+def _apply_delete(collection, key):
+    if collection == 'products':
+        catalog_versions.bump_catalog()
+    row = data_store[collection].pop(key)
+    _unindex_row(collection, row)
+    return row
+
+def _put(collection, row):
+    _apply_put(collection, row)
+    _record('put', collection, row.id, row)
+
+def _delete(collection, key):
+    row = _apply_delete(collection, key)
+    _record('del', collection, key)
+    return row
+
+def rebuild_indexes():
+    """Rebuild every secondary index and product rating aggregate from the primary collections"""
+    for index in indexes.values():
+        index.clear()
+    for listing in listings.values():
+        listing.clear()
+    catalog_versions.bump_catalog()
+    product_search.clear()
+    product_suggest.clear()
+    order_stats.clear()
+    sales_rollups.clear()
+    for collection in ('categories', 'users', 'products', 'reviews', 'orders', 'addresses'):
+        for row in data_store[collection].values():
+            _index_row(collection, row)
+
+def insert_user(user):
+    """Store a user and index its username and email"""
+    _put('users', user)
+
+def get_user_by_username(username):
+    """Get a user by exact username"""
+    return indexes['users_by_username'].get(username)
+
+def get_user_by_email(email):
+    """Get a user by exact email address"""
+    return indexes['users_by_email'].get(email)
+
+def find_user_by_login(login):
+    """Get a user whose username or email matches the login identifier"""
+    return get_user_by_username(login) or get_user_by_email(login)
+
+def insert_product(product):
+    """Store a product and index it under its category"""
+    _put('products', product)
+
+def update_product(product, **fields):
+    """Update product attributes, keeping the category index current"""
+    listed_as = _listing_fields(product)
+    _unindex_row('products', product)
+    for name, value in fields.items():
+        setattr(product, name, value)
+    _index_row('products', product)
+    if _listing_fields(product) != listed_as:
+        catalog_versions.bump_catalog()
+    _record('put', 'products', product.id, product)
+
+def apply_product_batch(new_products, changes):
+    """Insert new products and set fields on existing ones, as one transaction.
+
+    changes maps each existing product to a {field: value} dict. Stock-only
+    changes are not reindexed. When the batch reindexes a large share of the
+    catalog, the product indexes are rebuilt once instead of row by row.
+    """
+    reindexed = [product for product, fields in changes.items() if fields.keys() - {'stock'}]
+    rebuild = len(reindexed) + len(new_products) > max(100, len(data_store['products']) // 4)
+    with transaction():
+        for product, fields in changes.items():
+            if fields.keys() - {'stock'} and not rebuild:
+                _unindex_row('products', product)
+                for name, value in fields.items():
+                    setattr(product, name, value)
+                _index_row('products', product)
+            else:
+                for name, value in fields.items():
+                    setattr(product, name, value)
+                catalog_versions.bump_product(product.id)
+            _record('put', 'products', product.id, product)
+        for product in new_products:
+            if rebuild:
+                data_store['products'][product.id] = product
+                _record('put', 'products', product.id, product)
+            else:
+                _put('products', product)
+        if rebuild:
+            _reindex_products()
+        if reindexed or new_products:
+            catalog_versions.bump_catalog()
+
+def _reindex_products():
+    # Rebuild only the product-derived indexes, for batches that touch much of the catalog
+    indexes['products_by_category'].clear()
+    indexes['prices_by_category'].clear()
+    indexes['min_price_by_category'].clear()
+    listings['products'].clear()
+    listings['products_by_category'].clear()
+    product_search.clear()
+    product_suggest.clear()
+    for product in data_store['products'].values():
+        _index_row('products', product)
+
+def delete_product(product_id):
+    """Delete a product and its reviews, returning the number of reviews removed"""
+    reviews = get_product_reviews(product_id)
+    for review in reviews:
+        _delete('reviews', review.id)
+    _delete('products', product_id)
+    return len(reviews)
+
+def get_category_products(category_id):
+    """Get all products in a category"""
+    return list(indexes['products_by_category'].get(category_id, {}).values())
+
+def get_category_product_count(category_id):
+    """Number of products in a category"""
+    return len(indexes['products_by_category'].get(category_id, {}))
+
+def get_category_starting_price(category_id):
+    """Lowest product price in a category, or None if it has no products"""
+    return indexes['min_price_by_category'].get(category_id)
+
+def get_listing_page(name, scope=None, after=None, before=None, per_page=20, newest_first=False):
+    """One keyset page of a listing; see pagination.SortedIndex.page"""
+    listing = listings[name].get(scope)
+    if listing is None:
+        return Page([], 0, per_page)
+    return listing.page(after=after, before=before, per_page=per_page, newest_first=newest_first)
+
+def iter_listing(name, scope=None, start=None, end=None):
+    """Lazily iterate a listing's rows created in [start, end), oldest first"""
+    listing = listings[name].get(scope)
+    if listing is None:
+        return iter(())
+    return listing.iter_between(start, end)
+
+def insert_review(review):
+    """Store a review, index it under its product and update the product's rating aggregates"""
+    _put('reviews', review)
+
+def get_product_reviews(product_id):
+    """Get all reviews for a product"""
+    return list(indexes['reviews_by_product'].get(product_id, {}).values())
+
+def insert_order(order):
+    """Store an order and index it under its user"""
+    _put('orders', order)
+
+def update_order_status(order, status):
+    """Change an order's status, keeping the per-status order index current"""
+    _unindex_row('orders', order)
+    order.update_status(status)
+    _index_row('orders', order)
+    _record('put', 'orders', order.id, order)
+
+def get_recent_orders(limit=10, status=None):
+    """The newest orders, optionally only those with the given status"""
+    return get_orders_between(limit=limit, status=status, newest_first=True)
+
+def get_orders_between(start=None, end=None, status=None, limit=None, newest_first=False):
+    """Orders created in [start, end), optionally only those with the given status"""
+    listing = listings['orders_by_status' if status else 'orders'].get(status)
+    if listing is None:
+        return []
+    return listing.between(start, end, limit=limit, newest_first=newest_first)
+
+def get_order_status_counts():
+    """Number of orders in each status"""
+    return {status: len(listing) for status, listing in listings['orders_by_status'].items()}
+
+def get_sales_report(start=None, end=None, top_products=10):
+    """Sales for orders created in [start, end), read from the daily rollups.
+
+    Adds the best-selling products and per-category totals; categories are
+    resolved through each product's current category.
+    """
+    report = sales_rollups.query(start, end)
+    products = data_store['products']
+    product_units = report.pop('product_units')
+    product_revenue = report.pop('product_revenue')
+
+    report['top_products'] = []
+    for product_id, units in product_units.most_common(top_products):
+        product = products.get(product_id)
+        report['top_products'].append({
+            'id': product_id,
+            'name': product.name if product else 'Unknown Product',
+            'units': units,
+            'revenue': product_revenue[product_id]
+        })
+
+    by_category = {}
+    for product_id, units in product_units.items():
+        product = products.get(product_id)
+        name = product.category_name if product else None
+        totals = by_category.setdefault(name or 'Uncategorized', {'units': 0, 'revenue': 0})
+        totals['units'] += units
+        totals['revenue'] += product_revenue[product_id]
+    report['categories'] = sorted(
+        ({'name': name, **totals} for name, totals in by_category.items()),
+        key=lambda category: category['revenue'], reverse=True)
+    return report
+
+def check_order_stats(repair=False):
+    """Recompute order totals from scratch and return any drift from the running totals"""
+    expected = OrderStats.from_orders(data_store['orders'].values())
+    drift = order_stats.diff(expected)
+    if drift:
+        logging.warning(f"Order stats drift: {'; '.join(drift)}")
+        if repair:
+            order_stats.clear()
+            for order in data_store['orders'].values():
+                order_stats.add(order)
+    return drift
+
+def get_user_orders(user_id):
+    """Get all orders placed by a user"""
+    return list(indexes['orders_by_user'].get(user_id, {}).values())
+
+def insert_address(address):
+    """Store an address and index it under its user"""
+    _put('addresses', address)
+
+def get_user_addresses(user_id):
+    """Get all addresses saved by a user"""
+    return list(indexes['addresses_by_user'].get(user_id, {}).values())
+
+def insert_category(category):
+    """Store a category and index it by name"""
+    _put('categories', category)
+
+def get_category_by_name(name):
+    """Find a category by name, ignoring case"""
+    return indexes['categories_by_name'].get(name.lower())
+
+def update_category(category, **fields):
+    """Update category attributes, keeping the name index and its products' search entries current"""
+    _unindex_row('categories', category)
+    for name, value in fields.items():
+        setattr(category, name, value)
+    _index_row('categories', category)
+    _record('put', 'categories', category.id, category)
+
+def delete_category(category_id):
+    """Delete a category"""
+    _delete('categories', category_id)
+
+def add_visitor_log(ip_address, page=None):
+    """Queue a visit for the background visitor stats flusher"""
+    visitor_pipeline.submit(ip_address, page)
 
 def get_daily_visitors():
     """Get visitor count for today"""
-    today = datetime.now().date()
-    daily_visitors = [log for log in data_store['visitor_logs'] 
-                     if log.timestamp.date() == today]
-    return len(set(log.ip_address for log in daily_visitors))
+    return data_store['visitor_stats'].unique_visitors(datetime.now().date())
 
 def get_weekly_visitors():
     """Get visitor data for the past week"""
@@ -177,8 +734,6 @@ def get_weekly_visitors():
     
     for i in range(7):
         date = (week_ago + timedelta(days=i)).date()
-        daily_logs = [log for log in data_store['visitor_logs'] 
-                     if log.timestamp.date() == date]
-        weekly_data[date.strftime('%Y-%m-%d')] = len(set(log.ip_address for log in daily_logs))
+        weekly_data[date.strftime('%Y-%m-%d')] = data_store['visitor_stats'].unique_visitors(date)
     
     return weekly_data
@@ -0,0 +1,160 @@
+import io
+import csv
+import json
+import zlib
+from datetime import datetime, timedelta
+from data_store import data_store, indexes, iter_listing
+
+# Streaming admin exports. Rows are produced by generators over the keyset
+# listings and encoded into chunks of about CHUNK_BYTES, so memory stays
+# constant however many rows are exported. CSV headers and the gzip header
+# are flushed before any rows are read, so those downloads start
+# immediately; plain NDJSON has no header and starts with its first rows.
+
+CHUNK_BYTES = 64 * 1024
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+
+def _order_rows(start, end, status):
+    users = data_store['users']
+    rows = iter_listing('orders_by_status', status, start, end) if status else iter_listing('orders', None, start, end)
+    for order in rows:
+        customer = users.get(order.user_id)
+        # Line items are decoded from their packed form once per order
+        items = [{'product_id': item.product_id, 'quantity': item.quantity, 'price': item.price}
+                 for item in order.items]
+        yield {
+            'id': order.id,
+            'created_at': order.created_at.isoformat(timespec='seconds'),
+            'updated_at': order.updated_at.isoformat(timespec='seconds'),
+            'user_id': order.user_id,
+            'customer_email': customer.email if customer else '',
+            'status': order.status,
+            'payment_method': order.payment_method or '',
+            'total': f"{order.total:.2f}",
+            'item_count': sum(item['quantity'] for item in items),
+            'items': items,
+            'shipping_address': order.shipping_address
+        }
+
+
+def _customer_rows(start, end, status):
+    orders_by_user = indexes['orders_by_user']
+    for user in iter_listing('users', None, start, end):
+        yield {
+            'id': user.id,
+            'created_at': user.created_at.isoformat(timespec='seconds'),
+            'username': user.username,
+            'email': user.email,
+            'is_admin': user.is_admin,
+            'order_count': len(orders_by_user.get(user.id, ()))
+        }
+
+
+def _review_rows(start, end, status):
+    users = data_store['users']
+    products = data_store['products']
+    for review in iter_listing('reviews', None, start, end):
+        author = users.get(review.user_id)
+        product = products.get(review.product_id)
+        yield {
+            'id': review.id,
+            'created_at': review.created_at.isoformat(timespec='seconds'),
+            'product_id': review.product_id,
+            'product_name': product.name if product else '',
+            'user_id': review.user_id,
+            'username': author.username if author else '',
+            'rating': review.rating,
+            'comment': review.comment
+        }
+
+
+def _visitor_rows(start, end, status):
+    # Visitor stats are kept as per-day aggregates, one row per day and endpoint
+    stats = data_store['visitor_stats']
+    for day in stats.days():
+        if (start and day < start.date()) or (end and day >= end.date()):
+            continue
+        unique = stats.unique_visitors(day)
+        for endpoint, hits in sorted(stats.endpoint_hits(day).items(), key=lambda entry: str(entry[0])):
+            yield {'date': day.isoformat(), 'endpoint': endpoint or '', 'hits': hits, 'unique_visitors': unique}
+
+
+# name -> (row generator, CSV columns)
+EXPORTS = {
+    'orders': (_order_rows, ('id', 'created_at', 'updated_at', 'user_id', 'customer_email', 'status',
+                             'payment_method', 'total', 'item_count', 'items', 'shipping_address')),
+    'customers': (_customer_rows, ('id', 'created_at', 'username', 'email', 'is_admin', 'order_count')),
+    'reviews': (_review_rows, ('id', 'created_at', 'product_id', 'product_name', 'user_id', 'username',
+                               'rating', 'comment')),
+    'visitors': (_visitor_rows, ('date', 'endpoint', 'hits', 'unique_visitors'))
+}
+
+
+def parse_date_range(start=None, end=None):
+    """[start, end) datetimes from optional inclusive YYYY-MM-DD dates; raises ValueError"""
+    start = datetime.strptime(start, '%Y-%m-%d') if start else None
+    end = datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) if end else None
+    return start, end
+
+
+def _csv_items(items):
+    # Line items flattened to "product_id:quantity@price" pairs
+    return ';'.join(f"{item['product_id']}:{item['quantity']}@{item['price']:.2f}" for item in items)
+
+
+def _encode_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')  # headers out before the first row is read
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        if 'items' in row:
+            row['items'] = _csv_items(row['items'])
+        writer.writerow([row[column] for column in columns])
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _encode_ndjson(rows, columns):
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps(row, ensure_ascii=False, default=str) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK_BYTES:
+            yield ''.join(parts).encode('utf-8')
+            parts.clear()
+            size = 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    # Sync-flushing before the first chunk sends the gzip header before any rows are read
+    yield compressor.flush(zlib.Z_SYNC_FLUSH)
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if first:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(name, fmt='csv', start=None, end=None, status=None, compress=False):
+    """Generator of encoded chunks for an export; name and fmt must be keys of EXPORTS and FORMATS"""
+    row_source, columns = EXPORTS[name]
+    rows = row_source(start, end, status)
+    chunks = _encode_csv(rows, columns) if fmt == 'csv' else _encode_ndjson(rows, columns)
+    return _gzip(chunks) if compress else chunks
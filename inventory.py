@@ -0,0 +1,94 @@
+import threading
+
+from data_store import data_store, save_row
+
+# Stock changes go through this module so that every read-check-decrement of
+# a product's stock happens under that product's lock.
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+class InsufficientStockError(Exception):
+    """Raised when a reservation cannot be satisfied; product is None for unknown items"""
+
+    def __init__(self, product_id, product=None, requested=0):
+        self.product_id = product_id
+        self.product = product
+        self.requested = requested
+        name = product.name if product else 'unknown item'
+        super().__init__(f'Insufficient stock for {name}')
+
+
+def _lock_for(product_id):
+    lock = _locks.get(product_id)
+    if lock is None:
+        with _locks_guard:
+            lock = _locks.setdefault(product_id, threading.Lock())
+    return lock
+
+
+class _Locked:
+    """Hold the locks for a set of products, acquired in id order to avoid deadlock"""
+
+    def __init__(self, product_ids):
+        self.locks = [_lock_for(product_id) for product_id in sorted(set(product_ids))]
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+class Reservation:
+    """Stock taken for one order; release() puts it back"""
+
+    def __init__(self, lines):
+        self.lines = lines  # list of (product, quantity)
+        self.released = False
+
+    def release(self):
+        if self.released:
+            return
+        with _Locked(product.id for product, _ in self.lines):
+            for product, quantity in self.lines:
+                product.stock += quantity
+                save_row('products', product)
+        self.released = True
+
+
+def reserve_stock(items):
+    """Atomically take stock for every (product_id, quantity) pair, or none of it.
+
+    Raises InsufficientStockError for the first line that cannot be filled.
+    """
+    quantities = {}
+    for product_id, quantity in items:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    with _Locked(quantities):
+        lines = []
+        for product_id, quantity in quantities.items():
+            product = data_store['products'].get(product_id)
+            if not product or quantity <= 0 or product.stock < quantity:
+                raise InsufficientStockError(product_id, product, quantity)
+            lines.append((product, quantity))
+        for product, quantity in lines:
+            product.stock -= quantity
+            save_row('products', product)
+    return Reservation(lines)
+
+
+def stock_locks(product_ids):
+    """Context manager holding the stock locks of several products, for bulk stock changes"""
+    return _Locked(product_ids)
+
+
+def set_stock(product, stock):
+    """Set a product's stock level (admin restock or correction)"""
+    with _Locked([product.id]):
+        product.stock = int(stock)
+        save_row('products', product)
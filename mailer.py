@@ -0,0 +1,163 @@
+import os
+import time
+import queue
+import heapq
+import atexit
+import logging
+import itertools
+import threading
+from collections import deque
+
+
+class _MailJob:
+    __slots__ = ('message', 'attempts', 'enqueued_at', 'last_error')
+
+    def __init__(self, message):
+        self.message = message
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        self.last_error = None
+
+
+class MailDispatcher:
+    """Sends Flask-Mail messages from a background thread.
+
+    Views call enqueue() and return immediately. The dispatcher thread sends
+    whatever is queued over one SMTP connection, which it keeps open until
+    the queue has been idle for idle_timeout seconds. Failed sends are retried
+    with exponential backoff. After max_attempts a message moves to the
+    dead_letters list.
+    """
+
+    def __init__(self, app, mail, batch_size=50, max_attempts=5, backoff=2.0,
+                 idle_timeout=30.0, dead_letter_limit=1000):
+        self.app = app
+        self.mail = mail
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.dead_letters = deque(maxlen=dead_letter_limit)
+
+        self.sent = 0
+        self.failed_attempts = 0
+        self.last_latency = None
+        self._total_latency = 0.0
+
+        self._queue = queue.Queue()
+        self._retries = []  # heap of (due, seq, job)
+        self._seq = itertools.count()
+        self._connection = None
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread = None
+        self.start()
+        os.register_at_fork(after_in_child=self.start)
+        atexit.register(self.flush, 5.0)
+
+    def start(self):
+        """Start (or, after a fork, restart) the dispatcher thread"""
+        self._connection = None
+        self._thread = threading.Thread(target=self._run, name='mail-dispatcher', daemon=True)
+        self._thread.start()
+
+    def enqueue(self, message):
+        """Queue a message for delivery"""
+        with self._idle:
+            self._pending += 1
+        self._queue.put(_MailJob(message))
+
+    def flush(self, timeout=None):
+        """Wait until every queued message is sent or dead-lettered; returns False on timeout"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def get_stats(self):
+        """Queue depth, delivery counters and send latency"""
+        return {
+            'queue_depth': self._queue.qsize(),
+            'retrying': len(self._retries),
+            'sent': self.sent,
+            'failed_attempts': self.failed_attempts,
+            'dead_letters': len(self.dead_letters),
+            'last_latency_ms': round(self.last_latency * 1000, 1) if self.last_latency is not None else None,
+            'avg_latency_ms': round(self._total_latency / self.sent * 1000, 1) if self.sent else None
+        }
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    batch = self._next_batch()
+                    if batch:
+                        self._send_batch(batch)
+                    else:
+                        self._close_connection()
+                except Exception as e:
+                    logging.error(f"Mail dispatcher error: {e}")
+
+    def _next_batch(self):
+        timeout = self.idle_timeout
+        if self._retries:
+            timeout = max(0.0, min(timeout, self._retries[0][0] - time.monotonic()))
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=timeout))
+        except queue.Empty:
+            pass
+        now = time.monotonic()
+        while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+            batch.append(heapq.heappop(self._retries)[2])
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send_batch(self, batch):
+        for job in batch:
+            try:
+                if self._connection is None:
+                    connection = self.mail.connect()
+                    connection.__enter__()
+                    self._connection = connection
+                self._connection.send(job.message)
+            except Exception as e:
+                # The connection may be unusable after an SMTP error; reopen it next time
+                self._close_connection()
+                self._failed(job, e)
+                continue
+            latency = time.monotonic() - job.enqueued_at
+            self.sent += 1
+            self.last_latency = latency
+            self._total_latency += latency
+            logging.info(f"Email sent to {', '.join(job.message.recipients)}")
+            self._done()
+
+    def _failed(self, job, error):
+        self.failed_attempts += 1
+        job.attempts += 1
+        job.last_error = str(error)
+        if job.attempts >= self.max_attempts:
+            logging.error(f"Giving up on email to {', '.join(job.message.recipients)}: {error}")
+            self.dead_letters.append(job)
+            self._done()
+            return
+        delay = self.backoff * 2 ** (job.attempts - 1)
+        logging.warning(f"Email send failed ({error}); retrying in {delay:.0f}s")
+        heapq.heappush(self._retries, (time.monotonic() + delay, next(self._seq), job))
+
+    def _done(self):
+        with self._idle:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.notify_all()
+
+    def _close_connection(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except Exception:
+                pass
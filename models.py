@@ -1,7 +1,25 @@
+import struct
 from datetime import datetime
 from werkzeug.security import check_password_hash
 
-class User:
+class SlottedModel:
+    """Base for models that keep their fields in __slots__ instead of a per-instance __dict__"""
+    __slots__ = ()
+    
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+    
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # (dict state, slot state) as written by default pickling
+            state = {**(state[0] or {}), **(state[1] or {})}
+        for name, value in state.items():
+            if name in self.__slots__:
+                setattr(self, name, value)
+
+class User(SlottedModel):
+    __slots__ = ('id', 'username', 'email', 'password_hash', 'is_admin', 'created_at')
+    
     def __init__(self, user_id, username, email, password_hash, is_admin=False, created_at=None):
         self.id = user_id
         self.username = username
@@ -25,26 +43,81 @@ class User:
     def get_id(self):
         return str(self.id)
 
-class Product:
-    def __init__(self, product_id, name, description, price, category, image_url, stock=0, created_at=None):
+class Product(SlottedModel):
+    __slots__ = ('id', 'name', 'description', 'price', 'category_id', 'image_url', 'stock', 'created_at',
+                 'review_count', 'rating_sum', 'rating_histogram')
+    
+    def __init__(self, product_id, name, description, price, category_id, image_url, stock=0, created_at=None):
         self.id = product_id
         self.name = name
         self.description = description
         self.price = float(price)
-        self.category = category
+        self.category_id = category_id
         self.image_url = image_url
         self.stock = int(stock)
         self.created_at = created_at or datetime.now()
+        # Running review aggregates, maintained by data_store.insert_review
+        self.review_count = 0
+        self.rating_sum = 0
+        self.rating_histogram = [0, 0, 0, 0, 0]  # counts of 1..5 star ratings
     
-    def get_average_rating(self):
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if not hasattr(self, 'category_id'):
+            # Products persisted before categories were referenced by id carry
+            # the category name; data_store resolves it to an id after loading
+            if isinstance(state, tuple):
+                state = {**(state[0] or {}), **(state[1] or {})}
+            self.category_id = state.get('category')
+    
+    @property
+    def category(self):
         from data_store import data_store
-        reviews = [r for r in data_store['reviews'].values() if r.product_id == self.id]
-        if not reviews:
+        return data_store['categories'].get(self.category_id)
+    
+    @property
+    def category_name(self):
+        category = self.category
+        return category.name if category else ''
+    
+    def add_rating(self, rating):
+        self.review_count += 1
+        self.rating_sum += rating
+        self.rating_histogram[rating - 1] += 1
+    
+    def remove_rating(self, rating):
+        self.review_count -= 1
+        self.rating_sum -= rating
+        self.rating_histogram[rating - 1] -= 1
+    
+    def reset_ratings(self):
+        self.review_count = 0
+        self.rating_sum = 0
+        self.rating_histogram = [0, 0, 0, 0, 0]
+    
+    def get_average_rating(self):
+        if not self.review_count:
             return 0
-        return sum(review.rating for review in reviews) / len(reviews)
+        return self.rating_sum / self.review_count
+    
+    def get_rating_distribution(self):
+        """Return (stars, count, percent) rows from 5 stars down to 1"""
+        rows = []
+        for stars in range(5, 0, -1):
+            count = self.rating_histogram[stars - 1]
+            percent = count * 100 / self.review_count if self.review_count else 0
+            rows.append((stars, count, percent))
+        return rows
 
-class Order:
-    def __init__(self, order_id, user_id, total, shipping_address, status='pending', items=None, created_at=None):
+class Order(SlottedModel):
+    __slots__ = ('id', 'user_id', 'total', 'shipping_address', 'status', 'created_at', 'updated_at',
+                 'items', 'payment_method')
+    
+    STATUSES = ('pending', 'payment_pending', 'confirmed', 'preparing', 'out_for_delivery',
+                'delivered', 'cancelled')
+    
+    def __init__(self, order_id, user_id, total, shipping_address, status='pending', items=None,
+                 created_at=None, payment_method=None):
         self.id = order_id
         self.user_id = user_id
         self.total = float(total)
@@ -52,20 +125,68 @@ class Order:
         self.status = status
         self.created_at = created_at or datetime.now()
         self.updated_at = self.created_at
-        self.items = items or []  # List of order items
+        self.items = OrderItems(order_id, items)
+        self.payment_method = payment_method
+    
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if not isinstance(self.items, OrderItems):
+            # Orders persisted before line items were array-backed
+            self.items = OrderItems(self.id, self.items)
+        if not hasattr(self, 'payment_method'):
+            self.payment_method = None
     
     def update_status(self, new_status):
         self.status = new_status
         self.updated_at = datetime.now()
 
-class OrderItem:
+class OrderItem(SlottedModel):
+    __slots__ = ('order_id', 'product_id', 'quantity', 'price')
+    
     def __init__(self, order_id, product_id, quantity, price):
         self.order_id = order_id
         self.product_id = product_id
         self.quantity = int(quantity)
         self.price = float(price)
 
-class Review:
+class OrderItems:
+    """Line items of an order packed into one bytes buffer of (product_id, quantity, price) records.
+    
+    Iterating yields OrderItem views built on demand, so an order holds a
+    single small buffer instead of one dict per line item.
+    """
+    __slots__ = ('order_id', 'data')
+    
+    RECORD = struct.Struct('<qqd')
+    
+    def __init__(self, order_id, items=None):
+        self.order_id = order_id
+        self.data = b''
+        for item in items or ():
+            if isinstance(item, dict):
+                self.append(item['product_id'], item['quantity'], item['price'])
+            else:
+                self.append(item.product_id, item.quantity, item.price)
+    
+    def append(self, product_id, quantity, price):
+        self.data += self.RECORD.pack(product_id, int(quantity), float(price))
+    
+    def __len__(self):
+        return len(self.data) // self.RECORD.size
+    
+    def __iter__(self):
+        for product_id, quantity, price in self.RECORD.iter_unpack(self.data):
+            yield OrderItem(self.order_id, product_id, quantity, price)
+    
+    def __getstate__(self):
+        return (self.order_id, self.data)
+    
+    def __setstate__(self, state):
+        self.order_id, self.data = state
+
+class Review(SlottedModel):
+    __slots__ = ('id', 'product_id', 'user_id', 'rating', 'comment', 'created_at')
+    
     def __init__(self, review_id, product_id, user_id, rating, comment, created_at=None):
         self.id = review_id
         self.product_id = product_id
@@ -74,7 +195,9 @@ class Review:
         self.comment = comment
         self.created_at = created_at or datetime.now()
 
-class Category:
+class Category(SlottedModel):
+    __slots__ = ('id', 'name', 'description', 'image_url', 'is_active', 'created_at')
+    
     def __init__(self, category_id, name, description="", image_url="", is_active=True, created_at=None):
         self.id = category_id
         self.name = name
@@ -84,10 +207,12 @@ class Category:
         self.created_at = created_at or datetime.now()
     
     def get_product_count(self):
-        from data_store import data_store
-        return len([p for p in data_store['products'].values() if p.category == self.name])
+        from data_store import get_category_product_count
+        return get_category_product_count(self.id)
 
-class Address:
+class Address(SlottedModel):
+    __slots__ = ('id', 'user_id', 'name', 'street', 'city', 'state', 'zip_code', 'phone', 'created_at')
+    
     def __init__(self, address_id, user_id, name, street, city, state, zip_code, phone=None, created_at=None):
         self.id = address_id
         self.user_id = user_id
@@ -99,14 +224,18 @@ class Address:
         self.phone = phone
         self.created_at = created_at or datetime.now()
 
-class VisitorLog:
+class VisitorLog(SlottedModel):
+    __slots__ = ('ip_address', 'user_agent', 'page', 'timestamp')
+    
     def __init__(self, ip_address, user_agent, page=None, timestamp=None):
         self.ip_address = ip_address
         self.user_agent = user_agent
         self.page = page
         self.timestamp = timestamp or datetime.now()
 
-class CartItem:
+class CartItem(SlottedModel):
+    __slots__ = ('product_id', 'quantity', 'price')
+    
     def __init__(self, product_id, quantity, price):
         self.product_id = product_id
         self.quantity = int(quantity)
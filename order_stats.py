@@ -0,0 +1,77 @@
+from collections import Counter
+
+# Running order totals. Revenue is summed in integer paise so adding and
+# removing orders in any sequence never accumulates floating point error.
+
+
+def _paise(amount):
+    return round(amount * 100)
+
+
+class OrderStats:
+    """Order count and revenue, overall and per status"""
+
+    def __init__(self):
+        self.count = 0
+        self.revenue = 0  # paise
+        self.count_by_status = Counter()
+        self.revenue_by_status = Counter()  # paise
+
+    def add(self, order):
+        amount = _paise(order.total)
+        self.count += 1
+        self.revenue += amount
+        self.count_by_status[order.status] += 1
+        self.revenue_by_status[order.status] += amount
+
+    def remove(self, order):
+        amount = _paise(order.total)
+        self.count -= 1
+        self.revenue -= amount
+        self.count_by_status[order.status] -= 1
+        self.revenue_by_status[order.status] -= amount
+        if not self.count_by_status[order.status]:
+            del self.count_by_status[order.status]
+            del self.revenue_by_status[order.status]
+
+    def clear(self):
+        self.count = 0
+        self.revenue = 0
+        self.count_by_status.clear()
+        self.revenue_by_status.clear()
+
+    def summary(self):
+        """Dashboard figures, in rupees"""
+        return {
+            'total_orders': self.count,
+            'total_revenue': self.revenue / 100,
+            'pending_orders': self.count_by_status['pending'],
+            'completed_orders': self.count_by_status['delivered'],
+            'orders_by_status': dict(self.count_by_status),
+            'revenue_by_status': {status: paise / 100 for status, paise in self.revenue_by_status.items()}
+        }
+
+    @classmethod
+    def from_orders(cls, orders):
+        stats = cls()
+        for order in orders:
+            stats.add(order)
+        return stats
+
+    def diff(self, recount):
+        """Differences from a full recount, one line each; empty when the totals agree"""
+        drift = []
+
+        def compare(label, running, expected, money=False):
+            if running != expected:
+                if money:
+                    running, expected = f"{running / 100:.2f}", f"{expected / 100:.2f}"
+                drift.append(f"{label}: running {running}, recount {expected}")
+
+        compare('total orders', self.count, recount.count)
+        compare('total revenue', self.revenue, recount.revenue, money=True)
+        for status in sorted(set(self.count_by_status) | set(recount.count_by_status)):
+            compare(f"{status} orders", self.count_by_status[status], recount.count_by_status[status])
+            compare(f"{status} revenue", self.revenue_by_status[status], recount.revenue_by_status[status],
+                    money=True)
+        return drift
@@ -0,0 +1,142 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, g, make_response
+
+# Rendered-page cache for anonymous catalog views. Entries are validated on
+# read against CatalogVersions, which data_store bumps as the catalog changes:
+# the catalog version moves when listings change shape (products added,
+# removed, renamed or recategorised, categories edited), and each product's
+# own version moves when something shown about it changes (stock, price,
+# ratings). A listing page therefore survives checkouts of products it does
+# not show.
+
+
+class CatalogVersions:
+    """Change counters for the catalog as a whole and for each product"""
+
+    def __init__(self):
+        self.catalog = 0
+        self.changes = 0  # every bump, to spot renders that overlapped a change
+        self._products = {}
+
+    def bump_catalog(self):
+        self.catalog += 1
+        self.changes += 1
+
+    def bump_product(self, product_id):
+        self._products[product_id] = self._products.get(product_id, 0) + 1
+        self.changes += 1
+
+    def product(self, product_id):
+        return self._products.get(product_id, 0)
+
+
+class _Entry:
+    __slots__ = ('body', 'etag', 'catalog', 'products')
+
+    def __init__(self, body, etag, catalog, products):
+        self.body = body
+        self.etag = etag
+        self.catalog = catalog
+        self.products = products  # tuple of (product_id, version)
+
+
+class PageCache:
+    """Size-bounded LRU of rendered pages, keyed by path and query arguments"""
+
+    def __init__(self, versions, max_entries=512, max_bytes=32 * 1024 * 1024):
+        self.versions = versions
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _current(self, entry):
+        versions = self.versions
+        return entry.catalog == versions.catalog and all(
+            versions.product(product_id) == version for product_id, version in entry.products)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._current(entry):
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, key):
+        self._bytes -= len(self._entries.pop(key).body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def get_stats(self):
+        """Entry count, size and hit rate"""
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def cached(self, view):
+        """Serve a view's anonymous GET responses from the cache, with ETags.
+
+        Views call depends_on() with the products a page shows. Logged-in
+        visitors and requests with pending flash messages are rendered
+        normally, since their pages differ from the shared copy.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or 'user_id' in session or '_flashes' in session:
+                return view(*args, **kwargs)
+
+            key = (request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = self.get(key)
+            if entry is None:
+                changes, catalog = self.versions.changes, self.versions.catalog
+                g.page_versions = self.versions
+                g.page_products = ()
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.mimetype != 'text/html':
+                    return response
+                body = response.get_data()
+                entry = _Entry(body, hashlib.sha256(body).hexdigest()[:32], catalog, g.page_products)
+                # A render that overlapped a catalog change may mix old and new data
+                if self.versions.changes == changes:
+                    self.put(key, entry)
+
+            response = make_response(entry.body)
+            response.set_etag(entry.etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Cookie')
+            return response.make_conditional(request)
+        return wrapper
+
+
+def depends_on(products):
+    """Record the products shown on a cacheable page, and their current versions"""
+    versions = g.get('page_versions')
+    if versions is not None:
+        g.page_products += tuple((product.id, versions.product(product.id)) for product in products)
@@ -0,0 +1,184 @@
+import bisect
+from datetime import datetime, timedelta
+
+# Keyset pagination. Listings are ordered by (created_at, id), which never
+# changes for a row, so a cursor names a position that stays valid while rows
+# are added or removed around it. A page is found by bisecting to the cursor,
+# costing O(log N + page size) however deep the page is.
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(key):
+    """Opaque URL-safe cursor for a (created_at, id) key"""
+    created_at, row_id = key
+    return f"{(created_at - _EPOCH) // timedelta(microseconds=1)}.{row_id}"
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; None for missing or malformed cursors"""
+    try:
+        micros, row_id = cursor.split('.')
+        return _EPOCH + timedelta(microseconds=int(micros)), int(row_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def page_size(value, default=DEFAULT_PER_PAGE):
+    """Clamp a requested page size to 1..MAX_PER_PAGE"""
+    try:
+        return max(1, min(int(value), MAX_PER_PAGE))
+    except (TypeError, ValueError):
+        return default
+
+
+class Page:
+    __slots__ = ('items', 'total', 'per_page', 'next_cursor', 'prev_cursor')
+
+    def __init__(self, items, total, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.total = total
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+class SortedIndex:
+    """Rows kept in (created_at, id) order for keyset pagination"""
+
+    def __init__(self):
+        self._keys = []
+        self._rows = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def key(row):
+        return (row.created_at, row.id)
+
+    def add(self, row):
+        key = self.key(row)
+        if row.id in self._rows:
+            self.remove(self._rows[row.id])
+        # Rows usually arrive in creation order, so this is normally an append
+        if not self._keys or self._keys[-1] < key:
+            self._keys.append(key)
+        else:
+            bisect.insort(self._keys, key)
+        self._rows[row.id] = row
+
+    def remove(self, row):
+        stored = self._rows.pop(row.id, None)
+        if stored is None:
+            return
+        key = self.key(stored)
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def clear(self):
+        self._keys.clear()
+        self._rows.clear()
+
+    def page(self, after=None, before=None, per_page=DEFAULT_PER_PAGE, newest_first=False):
+        """The page following cursor `after` or preceding cursor `before`, in display order"""
+        keys = self._keys
+        count = len(keys)
+        after, before = decode_cursor(after), decode_cursor(before)
+        # Work on ascending keys; newest-first listings read them backwards
+        if newest_first:
+            after, before = before, after
+        if after is not None:
+            start = bisect.bisect_right(keys, after)
+            end = min(count, start + per_page)
+        elif before is not None:
+            end = bisect.bisect_left(keys, before)
+            start = max(0, end - per_page)
+        elif newest_first:
+            start, end = max(0, count - per_page), count
+        else:
+            start, end = 0, min(count, per_page)
+
+        selected = keys[start:end]
+        more_before, more_after = start > 0, end < count
+        if newest_first:
+            selected.reverse()
+            more_before, more_after = more_after, more_before
+        return Page([self._rows[key[1]] for key in selected], count, per_page,
+                    next_cursor=encode_cursor(selected[-1]) if more_after and selected else None,
+                    prev_cursor=encode_cursor(selected[0]) if more_before and selected else None)
+
+    def between(self, start=None, end=None, limit=None, newest_first=False):
+        """Rows created in [start, end), either bound optional, up to limit rows"""
+        keys = self._keys
+        lo = bisect.bisect_left(keys, (start,)) if start is not None else 0
+        hi = bisect.bisect_left(keys, (end,)) if end is not None else len(keys)
+        if limit is not None:
+            if newest_first:
+                lo = max(lo, hi - limit)
+            else:
+                hi = min(hi, lo + limit)
+        selected = keys[lo:hi]
+        if newest_first:
+            selected.reverse()
+        return [self._rows[key[1]] for key in selected]
+
+    def iter_between(self, start=None, end=None, chunk_size=1000):
+        """Lazily yield rows created in [start, end), oldest first.
+
+        Rows are read a chunk at a time, each chunk resuming after the last
+        key seen, so rows added or removed meanwhile never shift the scan
+        and only one chunk of keys is copied at once.
+        """
+        keys = self._keys
+        lo = bisect.bisect_left(keys, (start,)) if start is not None else 0
+        while True:
+            hi = bisect.bisect_left(keys, (end,)) if end is not None else len(keys)
+            selected = keys[lo:min(hi, lo + chunk_size)]
+            if not selected:
+                return
+            for key in selected:
+                row = self._rows.get(key[1])
+                if row is not None and self.key(row) == key:
+                    yield row
+            lo = bisect.bisect_right(keys, selected[-1])
+
+
+def paginate_sequence(items, after=None, before=None, per_page=DEFAULT_PER_PAGE):
+    """Page through an already ordered list, such as ranked search results.
+
+    The ranking is the sort key there, so cursors are positions in the list.
+    """
+    count = len(items)
+    try:
+        if after is not None:
+            start = max(0, int(after))
+            end = min(count, start + per_page)
+        elif before is not None:
+            end = min(count, max(0, int(before)))
+            start = max(0, end - per_page)
+        else:
+            start, end = 0, min(count, per_page)
+    except ValueError:
+        start, end = 0, min(count, per_page)
+    return Page(items[start:end], count, per_page,
+                next_cursor=str(end) if end < count else None,
+                prev_cursor=str(start) if start > 0 else None)
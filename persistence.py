@@ -0,0 +1,287 @@
+import os
+import glob
+import fcntl
+import pickle
+import struct
+import logging
+import threading
+from collections import deque
+
+# Durable storage for data_store: a pickled snapshot plus numbered append-only
+# log segments. Each log frame is a little-endian length prefix followed by a
+# pickled batch of (op, collection, key, value) records written by one
+# group commit.
+
+SNAPSHOT_FILE = 'snapshot.bin'
+SEGMENT_PATTERN = 'wal-%08d.log'
+FRAME_HEADER = struct.Struct('<I')
+
+
+def empty_state(collection_names):
+    """Return an empty state dict for the given collections"""
+    return {
+        'segment': 0,
+        'collections': {name: {} for name in collection_names},
+        'counters': {}
+    }
+
+
+def apply_records(state, records):
+    """Apply a sequence of mutation records to a state dict"""
+    collections = state['collections']
+    counters = state['counters']
+    for op, collection, key, value in records:
+        if op == 'put':
+            collections[collection][key] = value
+        elif op == 'del':
+            collections[collection].pop(key, None)
+        elif op == 'counter':
+            counters[key] = value
+
+
+def list_segments(directory):
+    """Return (number, path) pairs for all log segments, oldest first"""
+    segments = []
+    for path in glob.glob(os.path.join(directory, 'wal-*.log')):
+        try:
+            number = int(os.path.basename(path)[4:-4])
+        except ValueError:
+            continue
+        segments.append((number, path))
+    segments.sort()
+    return segments
+
+
+def read_segment(path):
+    """Yield record batches from a segment, stopping at a torn final frame"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    view = memoryview(data)
+    offset = 0
+    end = len(data)
+    while offset + FRAME_HEADER.size <= end:
+        (length,) = FRAME_HEADER.unpack_from(view, offset)
+        start = offset + FRAME_HEADER.size
+        if start + length > end:
+            logging.warning(f"Ignoring truncated frame at end of {path}")
+            break
+        yield pickle.loads(view[start:start + length])
+        offset = start + length
+
+
+def load_state(directory, collection_names, max_segment=None):
+    """Load the latest snapshot and replay newer log segments up to max_segment"""
+    state = empty_state(collection_names)
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, 'rb') as f:
+            snapshot = pickle.load(f)
+        state['segment'] = snapshot['segment']
+        state['counters'].update(snapshot['counters'])
+        for name, rows in snapshot['collections'].items():
+            state['collections'].setdefault(name, {}).update(rows)
+
+    for number, path in list_segments(directory):
+        if number <= state['segment']:
+            continue
+        if max_segment is not None and number > max_segment:
+            break
+        for batch in read_segment(path):
+            apply_records(state, batch)
+        state['segment'] = number
+    return state
+
+
+def write_snapshot(directory, state):
+    """Atomically replace the snapshot file with the given state"""
+    snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, snapshot_path)
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class MutationLog:
+    """Append-only mutation log with group-commit fsync and background compaction.
+
+    append() only queues the record; a flusher thread pickles queued records in
+    batches and fsyncs once per batch, so a crash can lose at most the last
+    commit_interval seconds of writes. A batch that fails to write stays
+    queued and is retried by the next flush.
+    """
+
+    def __init__(self, directory, collection_names, start_segment=1,
+                 commit_interval=0.005, max_batch=1000, segment_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.collection_names = tuple(collection_names)
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self.segment_bytes = segment_bytes
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(os.path.join(directory, 'LOCK'), 'w')
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            raise RuntimeError(f"Data directory {directory} is already in use by another process")
+
+        self._pending = deque()
+        self._pending_lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._compact_wake = threading.Event()
+        self._closed = False
+
+        self._segment = start_segment
+        self._file = open(os.path.join(directory, SEGMENT_PATTERN % self._segment), 'ab')
+
+        self._flusher = threading.Thread(target=self._flush_loop, name='wal-flusher', daemon=True)
+        self._compactor = threading.Thread(target=self._compact_loop, name='wal-compactor', daemon=True)
+        self._flusher.start()
+        self._compactor.start()
+        if any(number < start_segment for number, _ in list_segments(directory)):
+            self._compact_wake.set()
+
+    def append(self, record):
+        """Queue a mutation record for the next group commit"""
+        with self._pending_lock:
+            self._pending.append(record)
+            pending = len(self._pending)
+        if pending >= self.max_batch:
+            self._wake.set()
+
+    def flush(self):
+        """Write and fsync every queued record before returning"""
+        self._drain()
+
+    def compact(self):
+        """Seal the active segment and fold all sealed segments into the snapshot"""
+        with self._io_lock:
+            self._drain_locked()
+            self._rotate_locked()
+        self._compact_sealed()
+
+    def close(self):
+        """Flush outstanding records and stop the background threads"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._compact_wake.set()
+        self._flusher.join()
+        self._compactor.join()
+        self._drain()
+        self._file.close()
+        self._lock_file.close()
+
+    def _take_pending(self):
+        with self._pending_lock:
+            if not self._pending:
+                return None
+            batch = list(self._pending)
+            self._pending.clear()
+        return batch
+
+    def _drain(self):
+        with self._io_lock:
+            self._drain_locked()
+
+    def _drain_locked(self):
+        batch = self._take_pending()
+        if not batch:
+            return
+        try:
+            # Pickling can also fail if a request thread mutates a row meanwhile;
+            # the next flush then pickles its settled state
+            self._write_frame(pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL))
+        except BaseException:
+            # The batch stays queued, ahead of newer records, until it is fsynced
+            with self._pending_lock:
+                self._pending.extendleft(reversed(batch))
+            raise
+        if self._file.tell() >= self.segment_bytes:
+            self._rotate_locked()
+            self._compact_wake.set()
+
+    def _write_frame(self, payload):
+        if self._file.closed:
+            self._file = open(os.path.join(self.directory, SEGMENT_PATTERN % self._segment), 'ab')
+        position = self._file.tell()
+        try:
+            self._file.write(FRAME_HEADER.pack(len(payload)))
+            self._file.write(payload)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError:
+            self._discard_frame_locked(position)
+            raise
+
+    def _discard_frame_locked(self, position):
+        # Cut a partly written frame off the segment so frames written after it
+        # stay readable; if that fails, seal the segment with the torn frame at
+        # its end, where replay stops, and continue in a new one
+        path = self._file.name
+        try:
+            self._file.close()
+        except OSError:
+            pass  # unflushed bytes are past position and cut off below
+        try:
+            os.truncate(path, position)
+        except OSError:
+            self._segment += 1
+            path = os.path.join(self.directory, SEGMENT_PATTERN % self._segment)
+        self._file = open(path, 'ab')
+
+    def _rotate_locked(self):
+        self._file.close()
+        self._segment += 1
+        self._file = open(os.path.join(self.directory, SEGMENT_PATTERN % self._segment), 'ab')
+        _fsync_directory(self.directory)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.commit_interval)
+            self._wake.clear()
+            try:
+                self._drain()
+            except Exception as e:
+                logging.error(f"Failed to write mutation log: {e}")
+
+    def _compact_loop(self):
+        while not self._closed:
+            self._compact_wake.wait()
+            self._compact_wake.clear()
+            if self._closed:
+                break
+            try:
+                self._compact_sealed()
+            except Exception as e:
+                logging.error(f"Failed to compact mutation log: {e}")
+
+    def _compact_sealed(self):
+        # Compaction rebuilds state from disk rather than from the live store,
+        # so it never blocks request threads.
+        with self._compact_lock:
+            with self._io_lock:
+                active = self._segment
+            sealed = [(n, p) for n, p in list_segments(self.directory) if n < active]
+            if not sealed:
+                return
+            state = load_state(self.directory, self.collection_names, max_segment=sealed[-1][0])
+            write_snapshot(self.directory, state)
+            for number, path in sealed:
+                os.remove(path)
+            logging.info(f"Compacted {len(sealed)} log segment(s) into snapshot")
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Bulk import of products and stock levels from CSV or JSON.
+
+    python product_import.py restock.csv [--dry-run] [--skip-invalid]
+
+Rows name a product by id, or by name when there is no id column, and give
+any of name, description, price, category (name or id), image_url and stock.
+Rows that match no product create one, and need at least name, price and
+category. The CLI writes to the store configured by DATA_DIR and
+STORAGE_BACKEND; with the default memory backend, run it while the app is
+stopped.
+"""
+
+import io
+import sys
+import math
+import csv
+import json
+import argparse
+from models import Product
+from data_store import (data_store, init_data_store, get_next_id, get_category_by_name, apply_product_batch,
+                        transaction)
+from inventory import stock_locks
+
+# Column parsers raise ValueError with a message completing "<column> ..."
+
+
+def _parse_text(value):
+    return str(value).strip()
+
+
+def _parse_name(value):
+    value = _parse_text(value)
+    if not value:
+        raise ValueError('cannot be empty')
+    return value
+
+
+def _parse_price(value):
+    try:
+        price = round(float(value), 2)
+    except (TypeError, ValueError):
+        price = None
+    if price is None or not math.isfinite(price) or price < 0:  # NaN and infinity included
+        raise ValueError('must be a non-negative number')
+    return price
+
+
+def _parse_stock(value):
+    try:
+        stock = float(value)
+    except (TypeError, ValueError):
+        stock = -1.0
+    # Whole numbers may arrive as floats (5.0); 2.7, NaN and infinity are rejected
+    if not math.isfinite(stock) or stock < 0 or not stock.is_integer():
+        raise ValueError('must be a non-negative whole number')
+    return int(stock)
+
+
+def _parse_category(value):
+    text = str(value).strip()
+    category = data_store['categories'].get(int(text)) if text.isdigit() else get_category_by_name(text)
+    if category is None:
+        raise ValueError(f"'{text}' is not a known category")
+    return category.id
+
+
+COLUMNS = {
+    'name': ('name', _parse_name),
+    'description': ('description', _parse_text),
+    'price': ('price', _parse_price),
+    'category': ('category_id', _parse_category),
+    'image_url': ('image_url', _parse_text),
+    'stock': ('stock', _parse_stock)
+}
+REQUIRED_FOR_NEW = ('name', 'price', 'category_id')
+
+
+def read_rows(data, fmt):
+    """Rows of an import file as dicts; fmt is 'csv' or 'json'. Raises ValueError if unreadable"""
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    if fmt == 'json':
+        rows = json.loads(data)
+        if isinstance(rows, dict):
+            rows = rows.get('products')
+        if not isinstance(rows, list):
+            raise ValueError('JSON must be a list of products or {"products": [...]}')
+        return rows
+    reader = csv.DictReader(io.StringIO(data))
+    if not reader.fieldnames:
+        raise ValueError('CSV has no header row')
+    return list(reader)
+
+
+def plan_import(rows):
+    """Validate every row in one pass.
+
+    Returns (new product field dicts, {product: changed fields}, errors),
+    where each error is {'row': 1-based row number, 'errors': [messages]}.
+    """
+    products = data_store['products']
+    by_name = {product.name.lower(): product for product in products.values()}
+    new, changes, errors = [], {}, []
+    seen = set()
+
+    for number, row in enumerate(rows, 1):
+        if not isinstance(row, dict):
+            errors.append({'row': number, 'errors': ['expected an object with product fields']})
+            continue
+        row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+        problems = []
+
+        product = None
+        product_id = row.get('id')
+        if product_id not in (None, ''):
+            try:
+                product = products.get(int(product_id))
+            except (TypeError, ValueError):
+                problems.append('id must be a whole number')
+            else:
+                if product is None:
+                    problems.append(f"no product with id {product_id}")
+        elif row.get('name'):
+            product = by_name.get(str(row['name']).strip().lower())
+
+        fields = {}
+        for column, (attribute, parse) in COLUMNS.items():
+            value = row.get(column)
+            if value is None or value == '':
+                continue
+            try:
+                fields[attribute] = parse(value)
+            except ValueError as e:
+                problems.append(f"{column} {e}")
+
+        if product is None and not problems:
+            missing = [column for column, (attribute, _) in COLUMNS.items()
+                       if attribute in REQUIRED_FOR_NEW and attribute not in fields]
+            if missing:
+                problems.append(f"new products need {', '.join(missing)}")
+
+        key = ('id', product.id) if product else ('name', str(fields.get('name', '')).lower())
+        if key[1]:
+            if key in seen:
+                problems.append('repeats an earlier row for the same product')
+            seen.add(key)
+
+        if problems:
+            errors.append({'row': number, 'errors': problems})
+        elif product is None:
+            new.append(fields)
+        else:
+            changed = {attribute: value for attribute, value in fields.items()
+                       if getattr(product, attribute) != value}
+            if changed:
+                changes[product] = changed
+    return new, changes, errors
+
+
+def import_products(rows, dry_run=False, skip_invalid=False):
+    """Validate rows and apply them as one batch.
+
+    Nothing is applied if any row is invalid, unless skip_invalid is set.
+    Returns a report dict with counts, per-row errors and whether it applied.
+    """
+    with transaction():
+        new, changes, errors = plan_import(rows)
+        report = {
+            'rows': len(rows),
+            'created': len(new),
+            'updated': len(changes),
+            'unchanged': len(rows) - len(new) - len(changes) - len(errors),
+            'errors': errors,
+            'applied': False
+        }
+        if dry_run or (errors and not skip_invalid) or not (new or changes):
+            return report
+
+        with stock_locks(product.id for product, fields in changes.items() if 'stock' in fields):
+            new_products = [
+                Product(get_next_id('product_id'), fields['name'], fields.get('description', ''),
+                        fields['price'], fields['category_id'], fields.get('image_url', ''),
+                        stock=fields.get('stock', 0))
+                for fields in new
+            ]
+            apply_product_batch(new_products, changes)
+        report['applied'] = True
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path', help='CSV or JSON file; the extension picks the format')
+    parser.add_argument('--dry-run', action='store_true', help='Validate only')
+    parser.add_argument('--skip-invalid', action='store_true', help='Apply the valid rows even if some are invalid')
+    args = parser.parse_args()
+
+    fmt = 'json' if args.path.lower().endswith('.json') else 'csv'
+    with open(args.path, 'rb') as f:
+        rows = read_rows(f.read(), fmt)
+    init_data_store()
+    report = import_products(rows, dry_run=args.dry_run, skip_invalid=args.skip_invalid)
+
+    for error in report['errors']:
+        print(f"row {error['row']}: {'; '.join(error['errors'])}", file=sys.stderr)
+    print(f"{report['rows']} rows: {report['created']} new, {report['updated']} updated, "
+          f"{report['unchanged']} unchanged, {len(report['errors'])} invalid"
+          f"{'' if report['applied'] else ' (nothing applied)'}")
+    return 1 if report['errors'] and not report['applied'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,94 +1,183 @@
-from flask import render_template, request, redirect, url_for, flash, session, jsonify
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, g, Response
 from werkzeug.security import generate_password_hash, check_password_hash
-from app import app
-from models import User, Product, Order, Review, Address, OrderItem, VisitorLog, Category
-from data_store import data_store, add_visitor_log, get_next_id, get_weekly_visitors
+from werkzeug.local import LocalProxy
+from app import app, mail_dispatcher, page_cache, asset_manifest
+from models import User, Product, Order, Review, Address, OrderItem, OrderItems, VisitorLog, Category
+from data_store import (data_store, add_visitor_log, visitor_pipeline, get_next_id, get_weekly_visitors,
+                        insert_user, find_user_by_login, get_user_by_username, get_user_by_email,
+                        insert_product, update_product, delete_product,
+                        insert_review, insert_order, get_user_orders,
+                        update_order_status, get_recent_orders, get_order_status_counts, check_order_stats,
+                        get_sales_report,
+                        insert_address, get_user_addresses, insert_category, delete_category,
+                        get_category_by_name, update_category, get_category_product_count,
+                        get_category_starting_price, get_listing_page, save_row, sync_data_store, transaction)
 from utils import (get_current_user, add_to_cart, remove_from_cart, update_cart_quantity, 
                   get_cart_total, get_cart_count, clear_cart, send_order_confirmation_email,
-                  calculate_order_stats, search_products, get_cart)
+                  calculate_order_stats, search_products, get_search_suggestions,
+                  get_cart_lines, apply_cart_changes)
+from sessions import regenerate_session
+from inventory import reserve_stock, set_stock, InsufficientStockError
+from pagination import page_size, paginate_sequence
+from page_cache import depends_on
+from view_models import order_rows, order_item_rows, review_rows, store_counts
+from assets import send_asset
+from sales_rollups import date_range
+from exports import EXPORTS, FORMATS, parse_date_range, stream_export
+from product_import import read_rows, import_products
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 
+@app.before_request
+def sync_shared_store():
+    """Pick up writes committed by other workers before handling the request"""
+    sync_data_store()
+
 @app.before_request
 def log_visitor():
-    """Log visitor information"""
-    if request.endpoint not in ['static']:
-        try:
-            add_visitor_log(
-                request.remote_addr,
-                request.headers.get('User-Agent', ''),
-                request.endpoint
-            )
-        except Exception as e:
-            # If visitor logging fails, don't break the app
-            logging.warning(f"Failed to log visitor: {e}")
+    """Queue visitor information for the background flusher"""
+    endpoint = request.endpoint
+    if endpoint not in ('static', 'asset'):
+        add_visitor_log(request.remote_addr, endpoint)
 
 @app.context_processor
 def inject_globals():
-    """Inject global variables into templates"""
+    """Inject global variables into templates.
+    
+    The user and cart values are proxies: each is computed only when a
+    template first reads it, and at most once per request.
+    """
+    return {
+        'current_user': LocalProxy(get_current_user),
+        'cart_count': LocalProxy(get_cart_count),
+        'cart_total': LocalProxy(get_cart_total)
+    }
+
+@app.template_global()
+def page_url(**cursor):
+    """URL of the current page with the same query arguments but a different page cursor"""
+    # Query arguments named like a view argument would collide with it in url_for
+    args = {key: value for key, value in request.args.items() if key not in request.view_args}
+    args.pop('after', None)
+    args.pop('before', None)
+    args.update(cursor)
+    return url_for(request.endpoint, **request.view_args, **args)
+
+@app.template_global()
+def asset_url(filename):
+    """URL of a static file, using its fingerprinted build when there is one"""
+    built = asset_manifest.get(filename)
+    if built:
+        return url_for('asset', filename=built.split('/', 1)[1])
+    return url_for('static', filename=filename)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    """Fingerprinted CSS and JS, precompressed and cacheable forever"""
+    return send_asset(app.static_folder, filename)
+
+def _sales_range(default_days=30):
+    """[start, end) dates for a sales report, from ?start= and ?end= (inclusive) or ?days="""
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() + timedelta(days=1)
+        if start < end:
+            return start, end
+    except (KeyError, ValueError):
+        pass
+    days = max(1, min(request.args.get('days', default_days, type=int), 366))
+    return date_range(days)
+
+def _page_args(default_per_page):
+    """Cursor and page size arguments from the query string"""
     return {
-        'current_user': get_current_user(),
-        'cart_count': get_cart_count(),
-        'cart_total': get_cart_total(),
-        'data_store': data_store
+        'after': request.args.get('after'),
+        'before': request.args.get('before'),
+        'per_page': page_size(request.args.get('per_page'), default_per_page)
     }
 
 @app.route('/')
+@page_cache.cached
 def index():
     """Home page"""
     # Get first 6 products as featured
-    featured_products = list(data_store['products'].values())[:6]
+    featured_products = get_listing_page('products', per_page=6).items
+    depends_on(featured_products)
     return render_template('index.html', featured_products=featured_products)
 
 @app.route('/products')
+@page_cache.cached
 def products():
     """Products page with search and filter"""
     query = request.args.get('q', '')
     category = request.args.get('category', 'all')
     
-    if query or category != 'all':
-        product_list = search_products(query, category)
+    page_args = _page_args(24)
+    if query:
+        # Ranked results are ordered by relevance, so they page by position
+        page = paginate_sequence(search_products(query, category), **page_args)
+    elif category != 'all':
+        selected = get_category_by_name(category)
+        page = get_listing_page('products_by_category', selected.id if selected else None, **page_args)
     else:
-        product_list = list(data_store['products'].values())
+        page = get_listing_page('products', **page_args)
+    
+    depends_on(page.items)
     
     # Get categories from data store
     categories = [cat.name for cat in data_store['categories'].values() if cat.is_active]
     
     return render_template('products.html', 
-                         products=product_list, 
+                         products=page.items, 
+                         page=page,
                          categories=categories,
                          current_query=query,
                          current_category=category)
 
+@app.route('/search/suggest')
+def search_suggest():
+    """Typeahead suggestions for the search box as a small JSON payload"""
+    query = request.args.get('q', '')[:64]
+    products, categories = get_search_suggestions(query)
+    return jsonify({
+        'products': [{'name': p.name, 'url': url_for('product_detail', product_id=p.id)} for p in products],
+        'categories': [{'name': c.name, 'url': url_for('category_products', category_name=c.name)}
+                       for c in categories]
+    })
+
 @app.route('/categories')
+@page_cache.cached
 def categories():
     """Categories page showing all available categories"""
     active_categories = [cat for cat in data_store['categories'].values() if cat.is_active]
     return render_template('categories.html', categories=active_categories)
 
 @app.route('/category/<category_name>')
+@page_cache.cached
 def category_products(category_name):
     """Show products for a specific category"""
-    # Get the category object
-    category = None
-    for cat in data_store['categories'].values():
-        if cat.name == category_name and cat.is_active:
-            category = cat
-            break
-    
-    if not category:
+    category = get_category_by_name(category_name)
+    if not category or not category.is_active:
         flash('Category not found.', 'error')
         return redirect(url_for('products'))
     
-    # Get products for this category
-    category_products = [p for p in data_store['products'].values() if p.category == category_name]
+    # Get one page of products for this category
+    page = get_listing_page('products_by_category', category.id, **_page_args(24))
+    depends_on(page.items)
+    
+    # Kept current by the product index hooks, which bump the catalog
+    # version when it changes, so cached pages never show a stale one
+    starting_price = get_category_starting_price(category.id)
     
     return render_template('category_products.html', 
                          category=category, 
-                         products=category_products)
+                         products=page.items,
+                         page=page,
+                         starting_price=starting_price)
 
 @app.route('/product/<int:product_id>')
+@page_cache.cached
 def product_detail(product_id):
     """Product detail page"""
     product = data_store['products'].get(product_id)
@@ -96,10 +185,11 @@ def product_detail(product_id):
         from flask import abort
         abort(404)
     
-    # Get reviews for this product
-    product_reviews = [r for r in data_store['reviews'].values() if r.product_id == product_id]
+    # Get the newest page of reviews for this product
+    page = get_listing_page('reviews_by_product', product_id, newest_first=True, **_page_args(10))
+    depends_on([product])
     
-    return render_template('product_detail.html', product=product, reviews=product_reviews)
+    return render_template('product_detail.html', product=product, reviews=review_rows(page.items), page=page)
 
 @app.route('/add_to_cart/<int:product_id>', methods=['POST'])
 def add_to_cart_route(product_id):
@@ -116,21 +206,42 @@ def add_to_cart_route(product_id):
 @app.route('/cart')
 def cart():
     """Shopping cart page"""
-    cart_items = []
-    cart_data = get_cart()
-    
-    for product_id_str, item_data in cart_data.items():
-        product_id = int(product_id_str)
-        product = data_store['products'].get(product_id)
-        if product:
-            cart_items.append({
-                'product': product,
-                'quantity': item_data['quantity'],
-                'total': item_data['quantity'] * item_data['price']
-            })
+    cart_items = [
+        {'product': product, 'quantity': quantity, 'total': quantity * product.price}
+        for product, quantity in get_cart_lines()
+    ]
     
     return render_template('cart.html', cart_items=cart_items)
 
+@app.route('/cart/summary')
+def cart_summary():
+    """Cart item count and total as JSON; cached pages fill in the navbar badge from this"""
+    response = jsonify({'count': get_cart_count(), 'total': get_cart_total()})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/cart/items', methods=['POST'])
+def cart_items_api():
+    """Apply a batch of quantity changes sent as JSON; returns the new cart totals and changed lines"""
+    payload = request.get_json(silent=True)
+    changes = payload.get('items') if isinstance(payload, dict) else None
+    if not isinstance(changes, list):
+        return jsonify({'error': 'Expected a JSON object with an "items" list'}), 400
+    
+    updated, errors = apply_cart_changes(changes)
+    products = data_store['products']
+    items = {}
+    for product_id, quantity in updated.items():
+        product = products.get(product_id)
+        items[product_id] = {
+            'quantity': quantity,
+            'total': quantity * product.price if product and quantity else 0
+        }
+    
+    response = jsonify({'count': get_cart_count(), 'total': get_cart_total(), 'items': items, 'errors': errors})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @app.route('/update_cart', methods=['POST'])
 def update_cart():
     """Update cart quantities"""
@@ -162,14 +273,12 @@ def checkout():
         flash('Please login to checkout.', 'error')
         return redirect(url_for('login'))
     
-    cart_data = get_cart()
-    if not cart_data:
+    if not get_cart_lines():
         flash('Your cart is empty.', 'error')
         return redirect(url_for('cart'))
     
     # Get user addresses
-    user_addresses = [addr for addr in data_store['addresses'].values() 
-                     if addr.user_id == user.id]
+    user_addresses = get_user_addresses(user.id)
     
     # Calculate final amount
     cart_total = get_cart_total()
@@ -189,8 +298,8 @@ def place_order():
         flash('Please login to place an order.', 'error')
         return redirect(url_for('login'))
     
-    cart_data = get_cart()
-    if not cart_data:
+    cart_lines = get_cart_lines()
+    if not cart_lines:
         flash('Your cart is empty.', 'error')
         return redirect(url_for('cart'))
     
@@ -222,48 +331,43 @@ def place_order():
     if payment_method == 'cash_on_delivery':
         final_amount += 20.00  # COD handling charges
     
-    # Create order items and validate stock
-    order_items = []
-    
-    for product_id_str, item_data in cart_data.items():
-        product_id = int(product_id_str)
-        product = data_store['products'].get(product_id)
-        
-        if not product or product.stock < item_data['quantity']:
-            flash(f'Insufficient stock for {product.name if product else "unknown item"}.', 'error')
-            return redirect(url_for('cart'))
-        
-        order_items.append({
-            'product_id': product_id,
-            'quantity': item_data['quantity'],
-            'price': item_data['price']
-        })
-        
-        # Update stock
-        product.stock -= item_data['quantity']
-    
-    # Create order
-    order_id = get_next_id('order_id')
-    
     # Set order status based on payment method
     if payment_method == 'cash_on_delivery':
         status = 'pending'
     else:
         status = 'payment_pending'  # Waiting for QR payment confirmation
     
-    order = Order(
-        order_id=order_id,
-        user_id=user.id,
-        items=order_items,
-        total=final_amount,
-        shipping_address=shipping_address,
-        status=status
-    )
-    
-    # Add payment method info
-    order.payment_method = payment_method
+    # Create order items
+    order_items = OrderItems(None)
+    for product, quantity in cart_lines:
+        order_items.append(product.id, quantity, product.price)
     
-    data_store['orders'][order_id] = order
+    with transaction():
+        # Take stock for every item, or for none of them
+        try:
+            reservation = reserve_stock((item.product_id, item.quantity) for item in order_items)
+        except InsufficientStockError as e:
+            flash(f'{e}.', 'error')
+            return redirect(url_for('cart'))
+        
+        try:
+            # Create order
+            order_id = get_next_id('order_id')
+            
+            order = Order(
+                order_id=order_id,
+                user_id=user.id,
+                items=order_items,
+                total=final_amount,
+                shipping_address=shipping_address,
+                status=status,
+                payment_method=payment_method
+            )
+            
+            insert_order(order)
+        except Exception:
+            reservation.release()
+            raise
     
     # Send confirmation email (but catch any errors)
     try:
@@ -317,13 +421,13 @@ def confirm_payment(order_id):
     if not user:
         return jsonify({'error': 'Please login to proceed'}), 401
     
-    order = data_store['orders'].get(order_id)
-    if not order or order.user_id != user.id:
-        return jsonify({'error': 'Order not found'}), 404
-    
-    # Update order status to paid
-    order.status = 'confirmed'
-    order.updated_at = datetime.now()
+    with transaction():
+        order = data_store['orders'].get(order_id)
+        if not order or order.user_id != user.id:
+            return jsonify({'error': 'Order not found'}), 404
+        
+        # Update order status to paid
+        update_order_status(order, 'confirmed')
     
     # Clear payment session
     session.pop('payment_order_id', None)
@@ -350,28 +454,26 @@ def register():
             flash('Passwords do not match.', 'error')
             return render_template('auth/register.html')
         
-        # Check if user exists
-        existing_user = None
-        for user_obj in data_store['users'].values():
-            if user_obj.username == username or user_obj.email == email:
-                existing_user = user_obj
-                break
-        
-        if existing_user:
-            flash('Username or email already exists.', 'error')
-            return render_template('auth/register.html')
-        
-        # Create user
-        from data_store import get_next_id
-        user_id = get_next_id('user_id')
-        user = User(
-            user_id=user_id,
-            username=username,
-            email=email,
-            password_hash=generate_password_hash(password or '')
-        )
+        password_hash = generate_password_hash(password or '')
         
-        data_store['users'][user_id] = user
+        with transaction():
+            # Check if user exists
+            existing_user = get_user_by_username(username) or get_user_by_email(email)
+            
+            if existing_user:
+                flash('Username or email already exists.', 'error')
+                return render_template('auth/register.html')
+            
+            # Create user
+            user_id = get_next_id('user_id')
+            user = User(
+                user_id=user_id,
+                username=username,
+                email=email,
+                password_hash=password_hash
+            )
+            
+            insert_user(user)
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('login'))
     
@@ -385,14 +487,12 @@ def login():
         password = request.form.get('password')
         
         # Find user
-        user = None
-        for user_obj in data_store['users'].values():
-            if user_obj.username == username or user_obj.email == username:
-                user = user_obj
-                break
+        user = find_user_by_login(username)
         
         if user and user.check_password(password):
+            regenerate_session()
             session['user_id'] = user.id
+            g.pop('current_user', None)
             flash('Login successful!', 'success')
             
             next_page = request.args.get('next')
@@ -407,6 +507,9 @@ def logout():
     """User logout"""
     session.pop('user_id', None)
     session.pop('cart', None)
+    regenerate_session()
+    g.pop('current_user', None)
+    g.pop('cart_summary', None)
     flash('Logged out successfully.', 'success')
     return redirect(url_for('index'))
 
@@ -419,7 +522,7 @@ def profile():
         return redirect(url_for('login'))
     
     # Get user addresses
-    user_addresses = [addr for addr in data_store['addresses'].values() if addr.user_id == user.id]
+    user_addresses = get_user_addresses(user.id)
     
     return render_template('user/profile.html', addresses=user_addresses)
 
@@ -430,19 +533,19 @@ def add_address():
     if not user:
         return redirect(url_for('login'))
     
-    from data_store import get_next_id
-    address_id = get_next_id('address_id')
-    address = Address(
-        address_id=address_id,
-        user_id=user.id,
-        name=request.form.get('name'),
-        street=request.form.get('street'),
-        city=request.form.get('city'),
-        state=request.form.get('state'),
-        zip_code=request.form.get('zip_code')
-    )
-    
-    data_store['addresses'][address_id] = address
+    with transaction():
+        address_id = get_next_id('address_id')
+        address = Address(
+            address_id=address_id,
+            user_id=user.id,
+            name=request.form.get('name'),
+            street=request.form.get('street'),
+            city=request.form.get('city'),
+            state=request.form.get('state'),
+            zip_code=request.form.get('zip_code')
+        )
+        
+        insert_address(address)
     flash('Address added successfully!', 'success')
     return redirect(url_for('profile'))
 
@@ -454,11 +557,11 @@ def user_orders():
         flash('Please login to view your orders.', 'error')
         return redirect(url_for('login'))
     
-    user_orders_list = [order for order in data_store['orders'].values() if order.user_id == user.id]
+    user_orders_list = get_user_orders(user.id)
     
     user_orders_list.sort(key=lambda x: x.created_at, reverse=True)
     
-    return render_template('user/orders.html', orders=user_orders_list)
+    return render_template('user/orders.html', orders=order_rows(user_orders_list))
 
 @app.route('/order/<int:order_id>')
 def order_tracking(order_id):
@@ -473,19 +576,7 @@ def order_tracking(order_id):
         flash('Unauthorized access.', 'error')
         return redirect(url_for('index'))
     
-    # Get order items with product details
-    order_items = []
-    for item in order.items:
-        product = data_store['products'].get(item['product_id'])
-        if product:
-            order_items.append({
-                'product': product,
-                'quantity': item['quantity'],
-                'price': item['price'],
-                'total': item['quantity'] * item['price']
-            })
-    
-    return render_template('user/order_detail.html', order=order, order_items=order_items)
+    return render_template('user/order_detail.html', order=order, order_items=order_item_rows(order))
 
 @app.route('/add_review/<int:product_id>', methods=['POST'])
 def add_review(product_id):
@@ -495,20 +586,24 @@ def add_review(product_id):
         flash('Please login to add a review.', 'error')
         return redirect(url_for('login'))
     
-    rating = int(request.form.get('rating', '1'))
+    if product_id not in data_store['products']:
+        flash('Product not found.', 'error')
+        return redirect(url_for('products'))
+    
+    rating = max(1, min(5, int(request.form.get('rating', '1'))))
     comment = request.form.get('comment')
     
-    from data_store import get_next_id
-    review_id = get_next_id('review_id')
-    review = Review(
-        review_id=review_id,
-        product_id=product_id,
-        user_id=user.id,
-        rating=rating,
-        comment=comment
-    )
-    
-    data_store['reviews'][review_id] = review
+    with transaction():
+        review_id = get_next_id('review_id')
+        review = Review(
+            review_id=review_id,
+            product_id=product_id,
+            user_id=user.id,
+            rating=rating,
+            comment=comment
+        )
+        
+        insert_review(review)
     flash('Review added successfully!', 'success')
     return redirect(url_for('product_detail', product_id=product_id))
 
@@ -524,9 +619,7 @@ def admin_dashboard():
     stats = calculate_order_stats()
     from data_store import get_daily_visitors
     daily_visitors = get_daily_visitors()
-    recent_orders = list(data_store['orders'].values())
-    recent_orders.sort(key=lambda x: x.created_at, reverse=True)
-    recent_orders = recent_orders[:10]
+    recent_orders = get_recent_orders(10)
     
     return render_template('admin/dashboard.html', 
                          stats=stats, 
@@ -552,21 +645,72 @@ def admin_add_product():
     if not user or not user.is_admin:
         return redirect(url_for('index'))
     
-    product_id = get_next_id('product_id')
-    product = Product(
-        product_id=product_id,
-        name=request.form.get('name'),
-        description=request.form.get('description'),
-        price=float(request.form.get('price', '0')),
-        category=request.form.get('category'),
-        image_url=request.form.get('image_url'),
-        stock=int(request.form.get('stock', '0'))
-    )
-    
-    data_store['products'][product_id] = product
+    category = data_store['categories'].get(request.form.get('category', type=int))
+    if not category:
+        flash('Please choose a valid category.', 'error')
+        return redirect(url_for('admin_products'))
+    
+    with transaction():
+        product_id = get_next_id('product_id')
+        product = Product(
+            product_id=product_id,
+            name=request.form.get('name'),
+            description=request.form.get('description'),
+            price=float(request.form.get('price', '0')),
+            category_id=category.id,
+            image_url=request.form.get('image_url'),
+            stock=int(request.form.get('stock', '0'))
+        )
+        
+        insert_product(product)
     flash('Product added successfully!', 'success')
     return redirect(url_for('admin_products'))
 
+@app.route('/admin/import_products', methods=['POST'])
+def admin_import_products():
+    """Bulk create or update products and stock from a CSV or JSON upload.
+
+    A form upload from the products page flashes a summary; a raw CSV or
+    JSON request body gets the full report as JSON. ?dry_run=1 validates
+    only and ?skip_invalid=1 applies the valid rows despite errors.
+    """
+    user = get_current_user()
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    upload = request.files.get('file')
+    if upload:
+        data = upload.read()
+        fmt = 'json' if upload.filename.lower().endswith('.json') else 'csv'
+    else:
+        data = request.get_data()
+        fmt = 'json' if request.is_json else 'csv'
+    options = {name: request.values.get(name, '').lower() in ('1', 'true', 'on', 'yes')
+               for name in ('dry_run', 'skip_invalid')}
+    
+    try:
+        report = import_products(read_rows(data, fmt), **options)
+    except ValueError as e:
+        if not upload:
+            return jsonify({'error': f'Could not read the import: {e}'}), 400
+        flash(f'Could not read the import file: {e}', 'error')
+        return redirect(url_for('admin_products'))
+    
+    if not upload:
+        return jsonify(report), 200 if report['applied'] or not report['errors'] else 422
+    
+    summary = (f"{report['created']} new, {report['updated']} updated, "
+               f"{report['unchanged']} unchanged, {len(report['errors'])} invalid")
+    if report['applied']:
+        flash(f'Import applied: {summary}.', 'success')
+    elif report['errors']:
+        shown = '; '.join(f"row {error['row']}: {', '.join(error['errors'])}" for error in report['errors'][:5])
+        more = f" (and {len(report['errors']) - 5} more)" if len(report['errors']) > 5 else ''
+        flash(f'Import not applied ({summary}). {shown}{more}', 'error')
+    else:
+        flash(f"Import checked{' (dry run)' if options['dry_run'] else ''}: {summary}.", 'info')
+    return redirect(url_for('admin_products'))
+
 @app.route('/admin/update_stock/<int:product_id>', methods=['POST'])
 def admin_update_stock(product_id):
     """Update product stock"""
@@ -574,9 +718,11 @@ def admin_update_stock(product_id):
     if not user or not user.is_admin:
         return redirect(url_for('index'))
     
-    product = data_store['products'].get(product_id)
+    with transaction():
+        product = data_store['products'].get(product_id)
+        if product:
+            set_stock(product, request.form.get('stock', '0'))
     if product:
-        product.stock = int(request.form.get('stock', '0'))
         flash('Stock updated successfully!', 'success')
     
     return redirect(url_for('admin_products'))
@@ -593,15 +739,25 @@ def admin_edit_product():
         flash('Product ID is required.', 'error')
         return redirect(url_for('admin_products'))
     product_id = int(product_id_str)
-    product = data_store['products'].get(product_id)
     
+    with transaction():
+        product = data_store['products'].get(product_id)
+        category = data_store['categories'].get(request.form.get('category', type=int))
+        if product and not category:
+            flash('Please choose a valid category.', 'error')
+            return redirect(url_for('admin_products'))
+        
+        if product:
+            update_product(
+                product,
+                name=request.form.get('name'),
+                description=request.form.get('description'),
+                price=float(request.form.get('price', '0')),
+                category_id=category.id,
+                image_url=request.form.get('image_url')
+            )
+            set_stock(product, request.form.get('stock', '0'))
     if product:
-        product.name = request.form.get('name')
-        product.description = request.form.get('description')
-        product.price = float(request.form.get('price', '0'))
-        product.category = request.form.get('category')
-        product.image_url = request.form.get('image_url')
-        product.stock = int(request.form.get('stock', '0'))
         flash('Product updated successfully!', 'success')
     
     return redirect(url_for('admin_products'))
@@ -614,10 +770,13 @@ def admin_orders():
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
     
-    orders = list(data_store['orders'].values())
-    orders.sort(key=lambda x: x.created_at, reverse=True)
+    status = request.args.get('status')
+    if status:
+        page = get_listing_page('orders_by_status', status, newest_first=True, **_page_args(50))
+    else:
+        page = get_listing_page('orders', newest_first=True, **_page_args(50))
     
-    return render_template('admin/orders.html', orders=orders)
+    return render_template('admin/orders.html', orders=order_rows(page.items), page=page, current_status=status)
 
 @app.route('/admin/update_order_status/<int:order_id>', methods=['POST'])
 def admin_update_order_status(order_id):
@@ -626,10 +785,16 @@ def admin_update_order_status(order_id):
     if not user or not user.is_admin:
         return redirect(url_for('index'))
     
-    order = data_store['orders'].get(order_id)
+    new_status = request.form.get('status')
+    if new_status not in Order.STATUSES:
+        flash('Please choose a valid order status.', 'error')
+        return redirect(url_for('admin_orders'))
+    
+    with transaction():
+        order = data_store['orders'].get(order_id)
+        if order:
+            update_order_status(order, new_status)
     if order:
-        new_status = request.form.get('status')
-        order.update_status(new_status)
         flash('Order status updated successfully!', 'success')
     
     return redirect(url_for('admin_orders'))
@@ -644,11 +809,87 @@ def admin_analytics():
     
     weekly_visitors = get_weekly_visitors()
     stats = calculate_order_stats()
+    start, end = _sales_range()
     
     return render_template('admin/analytics.html', 
                          weekly_visitors=weekly_visitors,
+                         visitor_pipeline=visitor_pipeline.get_counters(),
+                         recent_orders=order_rows(get_recent_orders(8), with_items=False),
+                         sales=get_sales_report(start, end),
+                         sales_range=(start, end - timedelta(days=1)),
+                         store_counts=store_counts(),
+                         order_status_counts=get_order_status_counts(),
                          stats=stats)
 
+@app.route('/admin/mail_queue')
+def admin_mail_queue():
+    """Outbound email queue depth, delivery counters and latency"""
+    user = get_current_user()
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(mail_dispatcher.get_stats())
+
+@app.route('/admin/page_cache')
+def admin_page_cache():
+    """Rendered page cache size and hit rate"""
+    user = get_current_user()
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    return jsonify(page_cache.get_stats())
+
+@app.route('/admin/sales')
+def admin_sales():
+    """Sales rollups for a date range (?start=&end= or ?days=) as JSON"""
+    user = get_current_user()
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    start, end = _sales_range()
+    report = get_sales_report(start, end, top_products=request.args.get('top', 10, type=int))
+    report['start'], report['end'] = start.isoformat(), (end - timedelta(days=1)).isoformat()
+    return jsonify(report)
+
+@app.route('/admin/export/<name>')
+def admin_export(name):
+    """Stream orders, customers, reviews or visitor stats as CSV or NDJSON.
+
+    Takes ?format=csv|ndjson, ?start= and ?end= (inclusive YYYY-MM-DD),
+    ?status= for orders, and ?gzip=1 to compress on the fly.
+    """
+    user = get_current_user()
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    fmt = request.args.get('format', 'csv')
+    if name not in EXPORTS:
+        return jsonify({'error': f"Unknown export; choose from {', '.join(EXPORTS)}"}), 404
+    if fmt not in FORMATS:
+        return jsonify({'error': f"Unknown format; choose from {', '.join(FORMATS)}"}), 400
+    try:
+        start, end = parse_date_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    chunks = stream_export(name, fmt, start, end, request.args.get('status') or None, compress)
+    filename = f"{name}.{fmt}.gz" if compress else f"{name}.{fmt}"
+    response = Response(chunks, mimetype='application/gzip' if compress else FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/admin/order_stats', methods=['GET', 'POST'])
+def admin_order_stats():
+    """Running order totals checked against a full recount; POST also repairs any drift"""
+    user = get_current_user()
+    if not user or not user.is_admin:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    drift = check_order_stats(repair=request.method == 'POST')
+    return jsonify({'stats': calculate_order_stats(), 'drift': drift})
+
 # Admin User Management
 @app.route('/admin/users')
 def admin_users():
@@ -658,8 +899,8 @@ def admin_users():
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
     
-    users = list(data_store['users'].values())
-    return render_template('admin/users.html', users=users)
+    page = get_listing_page('users', **_page_args(50))
+    return render_template('admin/users.html', users=page.items, page=page)
 
 @app.route('/admin/categories')
 def admin_categories():
@@ -690,26 +931,21 @@ def admin_add_category():
             return render_template('admin/add_category.html')
         
         # Check if category name already exists
-        existing_category = None
-        for cat in data_store['categories'].values():
-            if cat.name.lower() == name.lower():
-                existing_category = cat
-                break
-        
-        if existing_category:
+        if get_category_by_name(name):
             flash('Category with this name already exists.', 'error')
             return render_template('admin/add_category.html')
         
         # Create new category
-        category_id = get_next_id('category_id')
-        new_category = Category(
-            category_id=category_id,
-            name=name,
-            description=description,
-            image_url=image_url
-        )
-        
-        data_store['categories'][category_id] = new_category
+        with transaction():
+            category_id = get_next_id('category_id')
+            new_category = Category(
+                category_id=category_id,
+                name=name,
+                description=description,
+                image_url=image_url
+            )
+            
+            insert_category(new_category)
         flash(f'Category "{name}" added successfully!', 'success')
         return redirect(url_for('admin_categories'))
     
@@ -738,22 +974,21 @@ def admin_edit_category(category_id):
             flash('Category name is required.', 'error')
             return render_template('admin/edit_category.html', category=category)
         
-        # Check if category name already exists (excluding current category)
-        existing_category = None
-        for cat in data_store['categories'].values():
-            if cat.name.lower() == name.lower() and cat.id != category_id:
-                existing_category = cat
-                break
-        
-        if existing_category:
-            flash('Category with this name already exists.', 'error')
-            return render_template('admin/edit_category.html', category=category)
-        
-        # Update category
-        category.name = name
-        category.description = description
-        category.image_url = image_url
-        category.is_active = is_active
+        with transaction():
+            category = data_store['categories'].get(category_id)
+            if not category:
+                flash('Category not found.', 'error')
+                return redirect(url_for('admin_categories'))
+            
+            # Check if category name already exists (excluding current category)
+            existing_category = get_category_by_name(name)
+            if existing_category and existing_category.id != category_id:
+                flash('Category with this name already exists.', 'error')
+                return render_template('admin/edit_category.html', category=category)
+            
+            # Update category; products refer to it by id, so a rename needs no product rewrites
+            update_category(category, name=name, description=description, image_url=image_url,
+                            is_active=is_active)
         
         flash(f'Category "{name}" updated successfully!', 'success')
         return redirect(url_for('admin_categories'))
@@ -768,12 +1003,13 @@ def admin_toggle_category_status(category_id):
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
     
-    category = data_store['categories'].get(category_id)
-    if not category:
-        flash('Category not found.', 'error')
-        return redirect(url_for('admin_categories'))
-    
-    category.is_active = not category.is_active
+    with transaction():
+        category = data_store['categories'].get(category_id)
+        if not category:
+            flash('Category not found.', 'error')
+            return redirect(url_for('admin_categories'))
+        
+        update_category(category, is_active=not category.is_active)
     status = "activated" if category.is_active else "deactivated"
     flash(f'Category "{category.name}" {status} successfully!', 'success')
     
@@ -787,20 +1023,21 @@ def admin_delete_category(category_id):
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
     
-    category = data_store['categories'].get(category_id)
-    if not category:
-        flash('Category not found.', 'error')
-        return redirect(url_for('admin_categories'))
-    
-    # Check if category has products
-    products_in_category = [p for p in data_store['products'].values() if p.category == category.name]
-    if products_in_category:
-        flash(f'Cannot delete category "{category.name}" because it contains {len(products_in_category)} products. Please move or delete these products first.', 'error')
-        return redirect(url_for('admin_categories'))
-    
-    # Delete the category
-    category_name = category.name
-    del data_store['categories'][category_id]
+    with transaction():
+        category = data_store['categories'].get(category_id)
+        if not category:
+            flash('Category not found.', 'error')
+            return redirect(url_for('admin_categories'))
+        
+        # Check if category has products
+        product_count = get_category_product_count(category.id)
+        if product_count:
+            flash(f'Cannot delete category "{category.name}" because it contains {product_count} products. Please move or delete these products first.', 'error')
+            return redirect(url_for('admin_categories'))
+        
+        # Delete the category
+        category_name = category.name
+        delete_category(category_id)
     flash(f'Category "{category_name}" deleted successfully!', 'success')
     
     return redirect(url_for('admin_categories'))
@@ -818,15 +1055,11 @@ def admin_delete_product(product_id):
         flash('Product not found.', 'error')
         return redirect(url_for('admin_products'))
     
-    # Delete associated reviews
-    reviews_to_delete = [r_id for r_id, review in data_store['reviews'].items() if review.product_id == product_id]
-    for review_id in reviews_to_delete:
-        del data_store['reviews'][review_id]
-    
-    # Delete the product
+    # Delete the product along with its reviews
     product_name = product.name
-    del data_store['products'][product_id]
-    flash(f'Product "{product_name}" and its {len(reviews_to_delete)} reviews deleted successfully!', 'success')
+    with transaction():
+        deleted_reviews = delete_product(product_id)
+    flash(f'Product "{product_name}" and its {deleted_reviews} reviews deleted successfully!', 'success')
     
     return redirect(url_for('admin_products'))
 
@@ -838,18 +1071,19 @@ def toggle_admin(user_id):
         flash('Access denied.', 'error')
         return redirect(url_for('index'))
     
-    target_user = data_store['users'].get(user_id)
-    if not target_user:
-        from flask import abort
-        abort(404)
-    
-    # Prevent removing admin from yourself
-    if target_user.id == current_user.id:
-        flash('You cannot remove admin privileges from yourself.', 'error')
-        return redirect(url_for('admin_users'))
-    
-    target_user.is_admin = not target_user.is_admin
-    # No commit needed for in-memory storage
+    with transaction():
+        target_user = data_store['users'].get(user_id)
+        if not target_user:
+            from flask import abort
+            abort(404)
+        
+        # Prevent removing admin from yourself
+        if target_user.id == current_user.id:
+            flash('You cannot remove admin privileges from yourself.', 'error')
+            return redirect(url_for('admin_users'))
+        
+        target_user.is_admin = not target_user.is_admin
+        save_row('users', target_user)
     
     action = 'granted' if target_user.is_admin else 'removed'
     flash(f'Admin privileges {action} for {target_user.username}.', 'success')
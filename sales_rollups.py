@@ -0,0 +1,141 @@
+import bisect
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from order_stats import _paise
+
+# Sales totals kept per day, updated as orders are indexed and unindexed, so a
+# date-range report sums one bucket per day instead of rescanning the order
+# history. Status totals count every order; sales (orders, revenue and units
+# overall and per product) leave out cancelled orders. Money is in paise.
+
+NON_SALE_STATUSES = frozenset({'cancelled'})
+
+
+class _Day:
+    __slots__ = ('orders', 'revenue', 'units', 'orders_by_status', 'revenue_by_status',
+                 'product_units', 'product_revenue')
+
+    def __init__(self):
+        self.orders = 0
+        self.revenue = 0
+        self.units = 0
+        self.orders_by_status = Counter()
+        self.revenue_by_status = Counter()
+        self.product_units = Counter()
+        self.product_revenue = Counter()
+
+
+def _adjust(counter, key, delta):
+    value = counter[key] + delta
+    if value:
+        counter[key] = value
+    else:
+        del counter[key]
+
+
+class SalesRollups:
+    """Per-day order, revenue and unit totals, overall, per status and per product"""
+
+    def __init__(self):
+        self._days = {}
+        self._dates = []  # sorted keys of _days, for range lookups
+        # Orders can be indexed on one thread while a report is summed on another
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._days)
+
+    def add(self, order):
+        self._apply(order, 1)
+
+    def remove(self, order):
+        self._apply(order, -1)
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._dates.clear()
+
+    def _apply(self, order, sign):
+        with self._lock:
+            self._apply_locked(order, sign)
+
+    def _apply_locked(self, order, sign):
+        day = order.created_at.date()
+        bucket = self._days.get(day)
+        if bucket is None:
+            bucket = self._days[day] = _Day()
+            bisect.insort(self._dates, day)
+
+        amount = sign * _paise(order.total)
+        _adjust(bucket.orders_by_status, order.status, sign)
+        _adjust(bucket.revenue_by_status, order.status, amount)
+        if order.status not in NON_SALE_STATUSES:
+            bucket.orders += sign
+            bucket.revenue += amount
+            for item in order.items:
+                bucket.units += sign * item.quantity
+                _adjust(bucket.product_units, item.product_id, sign * item.quantity)
+                _adjust(bucket.product_revenue, item.product_id, sign * _paise(item.quantity * item.price))
+
+        if not bucket.orders_by_status:
+            del self._days[day]
+            del self._dates[bisect.bisect_left(self._dates, day)]
+
+    def query(self, start=None, end=None):
+        """Totals for days in [start, end), either bound optional.
+
+        The daily series covers every day of a bounded range, with zeros for
+        days without orders. Revenue is in rupees.
+        """
+        with self._lock:
+            dates = self._dates
+            lo = bisect.bisect_left(dates, start) if start is not None else 0
+            hi = bisect.bisect_left(dates, end) if end is not None else len(dates)
+
+            orders = revenue = units = 0
+            orders_by_status = Counter()
+            revenue_by_status = Counter()
+            product_units = Counter()
+            product_revenue = Counter()
+            for day in dates[lo:hi]:
+                bucket = self._days[day]
+                orders += bucket.orders
+                revenue += bucket.revenue
+                units += bucket.units
+                orders_by_status.update(bucket.orders_by_status)
+                revenue_by_status.update(bucket.revenue_by_status)
+                product_units.update(bucket.product_units)
+                product_revenue.update(bucket.product_revenue)
+
+            daily = {'dates': [], 'orders': [], 'revenue': [], 'units': []}
+            if lo < hi or (start is not None and end is not None):
+                day = start if start is not None else dates[lo]
+                last = end if end is not None else dates[hi - 1] + timedelta(days=1)
+            else:
+                day = last = None
+            while day is not None and day < last:
+                bucket = self._days.get(day)
+                daily['dates'].append(day.isoformat())
+                daily['orders'].append(bucket.orders if bucket else 0)
+                daily['revenue'].append(bucket.revenue / 100 if bucket else 0)
+                daily['units'].append(bucket.units if bucket else 0)
+                day += timedelta(days=1)
+
+        return {
+            'orders': orders,
+            'revenue': revenue / 100,
+            'units': units,
+            'orders_by_status': dict(orders_by_status),
+            'revenue_by_status': {status: paise / 100 for status, paise in revenue_by_status.items()},
+            'product_units': product_units,
+            'product_revenue': Counter({pid: paise / 100 for pid, paise in product_revenue.items()}),
+            'daily': daily
+        }
+
+
+def date_range(days, today=None):
+    """[start, end) covering the last `days` days up to and including today"""
+    end = (today or date.today()) + timedelta(days=1)
+    return end - timedelta(days=days), end
@@ -0,0 +1,272 @@
+import re
+import heapq
+import bisect
+
+# Inverted index for product search. Each product contributes weighted terms
+# from its name, category and description; a query matches products that
+# contain every query term (AND), either as a whole word or as a prefix.
+# Whole words are matched by stem; prefixes are matched against the words as
+# written, since a partly typed word ("pastri") rarely stems like the full one.
+
+FIELD_WEIGHTS = (('name', 3.0), ('category_name', 2.0), ('description', 1.0))
+PREFIX_FACTOR = 0.5  # prefix-only matches score lower than whole-word matches
+MIN_PREFIX = 2
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def stem(word):
+    """Light plural stemming (pastries -> pastry, peaches -> peach, muffins -> muffin)"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('es') and word[-3] in 'sxz':
+        return word[:-2]
+    if len(word) > 4 and word.endswith(('ches', 'shes')):
+        return word[:-2]
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Lowercased word tokens of text"""
+    return _TOKEN_RE.findall((text or '').lower())
+
+
+class SearchIndex:
+    def __init__(self):
+        self._postings = {}  # term -> {product_id: weight}
+        self._word_counts = {}  # unstemmed word -> number of products using it
+        self._doc_terms = {}  # product_id -> (terms, words), for removal
+        self._sorted_words = None  # vocabulary for prefix lookups, rebuilt lazily
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def add(self, product):
+        """Index a product, replacing any previous entry for its id"""
+        self.remove(product.id)
+        weights = {}
+        words = set()
+        for field, field_weight in FIELD_WEIGHTS:
+            for token in tokenize(getattr(product, field)):
+                words.add(token)
+                term = stem(token)
+                weights[term] = weights.get(term, 0.0) + field_weight
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[product.id] = weight
+        for word in words:
+            count = self._word_counts.get(word, 0)
+            if not count:
+                self._sorted_words = None
+            self._word_counts[word] = count + 1
+        self._doc_terms[product.id] = (tuple(weights), tuple(words))
+
+    def remove(self, product_id):
+        """Drop a product from the index"""
+        entry = self._doc_terms.pop(product_id, None)
+        if not entry:
+            return
+        terms, words = entry
+        for term in terms:
+            postings = self._postings[term]
+            del postings[product_id]
+            if not postings:
+                del self._postings[term]
+        for word in words:
+            count = self._word_counts[word] - 1
+            if count:
+                self._word_counts[word] = count
+            else:
+                del self._word_counts[word]
+                self._sorted_words = None
+
+    def clear(self):
+        self._postings.clear()
+        self._word_counts.clear()
+        self._doc_terms.clear()
+        self._sorted_words = None
+
+    def _prefix_terms(self, prefix):
+        # Stems of the indexed words that start with prefix
+        words = self._sorted_words
+        if words is None:
+            words = self._sorted_words = sorted(self._word_counts)
+        start = bisect.bisect_left(words, prefix)
+        end = bisect.bisect_left(words, prefix + '\uffff', start)
+        return list(dict.fromkeys(stem(word) for word in words[start:end]))
+
+    def _expand(self, token):
+        # (term, factor) pairs a query token matches: its whole-word stem, and
+        # the stem of every indexed word it is a prefix of at a reduced weight
+        exact = stem(token)
+        terms = [(exact, 1.0)] if exact in self._postings else []
+        if len(token) >= MIN_PREFIX:
+            terms.extend((term, PREFIX_FACTOR) for term in self._prefix_terms(token) if term != exact)
+        return terms
+
+    def _term_scores(self, terms):
+        # product_id -> best score over all of a token's matching terms. The
+        # common single whole-word case returns the posting dict itself, so
+        # callers must not modify the result.
+        term, factor = terms[0]
+        if len(terms) == 1 and factor == 1.0:
+            return self._postings[term]
+        scores = {pid: weight * factor for pid, weight in self._postings[term].items()}
+        for term, factor in terms[1:]:
+            postings = self._postings[term]
+            for pid in postings.keys() - scores.keys():
+                scores[pid] = postings[pid] * factor
+            for pid in postings.keys() & scores.keys():
+                weight = postings[pid] * factor
+                if weight > scores[pid]:
+                    scores[pid] = weight
+        return scores
+
+    def search(self, query, limit=None):
+        """Return product ids matching every query term, best match first"""
+        expanded = []
+        for token in dict.fromkeys(tokenize(query)):
+            terms = self._expand(token)
+            if not terms:
+                return []
+            size = sum(len(self._postings[term]) for term, _ in terms)
+            expanded.append((size, terms))
+        if not expanded:
+            return []
+        expanded.sort(key=lambda entry: entry[0])
+
+        # Intersect starting from the rarest token so the candidate set only shrinks
+        totals = self._term_scores(expanded[0][1])
+        for _, terms in expanded[1:]:
+            scores = self._term_scores(terms)
+            totals = {pid: totals[pid] + scores[pid] for pid in totals.keys() & scores.keys()}
+            if not totals:
+                return []
+        # Both are stable, so equal scores keep indexing order
+        if limit is not None and limit < len(totals):
+            return heapq.nlargest(limit, totals, key=totals.get)
+        return sorted(totals, key=totals.get, reverse=True)
+
+
+class _TrieNode:
+    __slots__ = ('children', 'keys', 'top', 'stale')
+
+    def __init__(self):
+        self.children = {}
+        self.keys = set()  # entries with a word ending exactly here
+        self.top = []  # best (-score, key) pairs in this subtree, ascending
+        self.stale = False
+
+
+class PrefixSuggester:
+    """Prefix trie over the words of short names, for typeahead.
+
+    Every node keeps the top_k best-scoring entries below it, so a lookup
+    walks at most max_depth nodes and reads a precomputed list. When an entry
+    leaves a node's full top list, the node is marked stale and refilled
+    from its children on the next lookup that reaches it.
+    """
+
+    def __init__(self, top_k=32, max_depth=16):
+        self.top_k = top_k
+        self.max_depth = max_depth
+        self._root = _TrieNode()
+        self._entries = {}  # key -> (score, words)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _words(self, text):
+        return tuple(dict.fromkeys(token[:self.max_depth] for token in tokenize(text)))
+
+    def add(self, key, text, score=0):
+        """Index key under every word of text, replacing any previous entry"""
+        words = self._words(text)
+        if self._entries.get(key) == (score, words):
+            return
+        self.remove(key)
+        self._entries[key] = (score, words)
+        item = (-score, key)
+        for word in words:
+            node = self._root
+            for char in word:
+                node = node.children.setdefault(char, _TrieNode())
+                if node.stale:
+                    continue
+                top = node.top
+                if len(top) < self.top_k or item < top[-1]:
+                    i = bisect.bisect_left(top, item)
+                    if i == len(top) or top[i] != item:  # words may share a prefix
+                        top.insert(i, item)
+                        del top[self.top_k:]
+            node.keys.add(key)
+
+    def remove(self, key):
+        """Drop key from the trie"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        score, words = entry
+        item = (-score, key)
+        for word in words:
+            path = []
+            node = self._root
+            for char in word:
+                node = node.children[char]
+                path.append((node, char))
+            node.keys.discard(key)
+            for node, _ in path:
+                if node.stale:
+                    continue
+                i = bisect.bisect_left(node.top, item)
+                if i < len(node.top) and node.top[i] == item:
+                    if len(node.top) == self.top_k:
+                        node.stale = True  # something outside the list may move up
+                    else:
+                        del node.top[i]
+            # Prune branches that no longer lead to any entry
+            for depth in range(len(path) - 1, -1, -1):
+                node, char = path[depth]
+                if node.keys or node.children:
+                    break
+                parent = path[depth - 1][0] if depth else self._root
+                del parent.children[char]
+
+    def clear(self):
+        self._root = _TrieNode()
+        self._entries.clear()
+
+    def _refresh(self, node):
+        candidates = [(-self._entries[key][0], key) for key in node.keys]
+        for child in node.children.values():
+            if child.stale:
+                self._refresh(child)
+            candidates.extend(child.top)
+        node.top = heapq.nsmallest(self.top_k, set(candidates))
+        node.stale = False
+
+    def suggest(self, query, limit=8):
+        """Keys whose words start with every query token, best score first.
+
+        The last token selects the trie node; earlier tokens filter its
+        precomputed list, so multi-word queries can return fewer than limit.
+        """
+        tokens = list(dict.fromkeys(token[:self.max_depth] for token in tokenize(query)))
+        if not tokens:
+            return []
+        node = self._root
+        for char in tokens[-1]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        if node.stale:
+            self._refresh(node)
+        results = []
+        for _, key in node.top:
+            words = self._entries[key][1]
+            if all(any(word.startswith(token) for word in words) for token in tokens[:-1]):
+                results.append(key)
+                if len(results) == limit:
+                    break
+        return results
@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SecureCookieSession
+
+# Server-side sessions. The cookie carries only an opaque random session id;
+# the session data lives in a SessionStore. A session is serialized and
+# written back only when a request changed it, and visitors who never store
+# anything get no cookie at all.
+
+_SID_RE = re.compile(r'^[A-Za-z0-9_-]{43}$')  # secrets.token_urlsafe(32)
+
+
+class ServerSession(SecureCookieSession):
+    """Session dict that tracks changes and the id it is stored under"""
+
+    def __init__(self, initial=None, sid=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.stale_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh id when the response is saved; the old id is dropped"""
+        if self.sid is not None and self.stale_sid is None:
+            self.stale_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class SessionStore:
+    """Where serialized sessions are kept, keyed by session id"""
+
+    def get(self, sid):
+        """Return the stored data for a session id, or None if missing or expired"""
+        raise NotImplementedError
+
+    def set(self, sid, data, lifetime):
+        """Store data for a session id, expiring after lifetime seconds"""
+        raise NotImplementedError
+
+    def delete(self, sid):
+        """Drop a session id"""
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local LRU of sessions; the least recently used are dropped past max_entries"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # sid -> (expires, data)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return entry[1]
+
+    def set(self, sid, data, lifetime):
+        with self._lock:
+            self._entries[sid] = (time.time() + lifetime, data)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a local SQLite database, shared by every worker on the host"""
+
+    # Expired rows are purged after this many writes
+    PURGE_EVERY = 1000
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires);
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, sid):
+        row = self._connection().execute(
+            'SELECT data FROM sessions WHERE id = ? AND expires >= ?', (sid, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, data, lifetime):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)',
+                     (sid, data, now + lifetime))
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            conn.execute('DELETE FROM sessions WHERE expires < ?', (now,))
+
+    def delete(self, sid):
+        self._connection().execute('DELETE FROM sessions WHERE id = ?', (sid,))
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over a SessionStore"""
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SID_RE.match(sid):
+            data = self.store.get(sid)
+            if data is not None:
+                try:
+                    return ServerSession(self.serializer.loads(data), sid)
+                except ValueError:
+                    pass
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+        if session.stale_sid is not None:
+            self.store.delete(session.stale_sid)
+            session.stale_sid = None
+
+        if not session:
+            # Emptied sessions are dropped; sessions that never held anything set no cookie
+            if session.sid is not None and session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        if not session.modified:
+            return
+
+        new_sid = session.sid is None
+        if new_sid:
+            session.sid = secrets.token_urlsafe(32)
+        lifetime = int(app.permanent_session_lifetime.total_seconds())
+        self.store.set(session.sid, self.serializer.dumps(dict(session)), lifetime)
+        if new_sid or session.permanent:
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+
+def regenerate_session():
+    """Give the current session a fresh id, e.g. on login, so an id planted beforehand stops working"""
+    if isinstance(session._get_current_object(), ServerSession):
+        session.regenerate()
+
+
+def create_session_interface():
+    """Session interface selected by SESSION_BACKEND (memory, sqlite or cookie).
+
+    Defaults to sqlite when STORAGE_BACKEND is sqlite, so sessions are shared
+    by the same workers as the data, and to memory otherwise. Returns None
+    for cookie, which keeps Flask's signed cookie sessions.
+    """
+    storage_backend = os.environ.get('STORAGE_BACKEND', 'memory').lower()
+    kind = os.environ.get('SESSION_BACKEND', 'sqlite' if storage_backend == 'sqlite' else 'memory').lower()
+    if kind == 'cookie':
+        return None
+    if kind == 'memory':
+        return ServerSessionInterface(MemorySessionStore(int(os.environ.get('SESSION_CACHE_SIZE', '10000'))))
+    if kind == 'sqlite':
+        path = os.environ.get('SESSION_PATH') or os.path.join(os.environ.get('DATA_DIR') or 'data', 'sessions.db')
+        return ServerSessionInterface(SQLiteSessionStore(path))
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
@@ -5,12 +5,19 @@
 
 class CartManager {
     constructor() {
+        // Quantity edits made in quick succession go to the server as one batch
+        this.pendingChanges = new Map();
+        this.flushTimer = null;
+        this.flushDelay = 300;
         this.init();
     }
 
     init() {
         this.bindEvents();
-        this.updateCartDisplay();
+        // Cached catalog pages are shared, so their badge is filled in here
+        if (document.querySelector('[data-cart-pending]')) {
+            this.updateCartCount();
+        }
     }
 
     bindEvents() {
@@ -47,6 +54,60 @@ class CartManager {
                 this.handleQuantityChange(e.target);
             }
         });
+
+        // Enter in a quantity box applies the change instead of reloading the page
+        document.addEventListener('submit', (e) => {
+            if (e.target.matches('.cart-quantity-form')) {
+                e.preventDefault();
+                const input = e.target.querySelector('.quantity-input');
+                if (input) this.handleQuantityChange(input);
+            }
+        });
+    }
+
+    sendChanges(items) {
+        return fetch('/cart/items', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ items: items })
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to update cart');
+            }
+            return response.json();
+        })
+        .then(result => {
+            this.applyCartResult(result);
+            return result;
+        });
+    }
+
+    queueChange(productId, quantity) {
+        this.pendingChanges.set(productId, quantity);
+        clearTimeout(this.flushTimer);
+        this.flushTimer = setTimeout(() => this.flushChanges(), this.flushDelay);
+    }
+
+    flushChanges() {
+        if (this.pendingChanges.size === 0) return;
+
+        const items = Array.from(this.pendingChanges, ([productId, quantity]) => ({
+            product_id: productId,
+            quantity: quantity
+        }));
+        this.pendingChanges.clear();
+
+        this.sendChanges(items)
+        .then(result => {
+            if (result.errors.length === 0) {
+                this.showCartNotification('Cart updated!', 'success');
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            this.showCartNotification('Failed to update cart', 'error');
+        });
     }
 
     handleAddToCart(button) {
@@ -54,41 +115,23 @@ class CartManager {
                          button.closest('form')?.action?.split('/').pop();
         const form = button.closest('form');
         const quantityInput = form?.querySelector('select[name="quantity"], input[name="quantity"]');
-        const quantity = quantityInput ? quantityInput.value : 1;
+        const quantity = quantityInput ? parseInt(quantityInput.value) : 1;
 
         // Show loading state
         this.setButtonLoading(button, true);
 
-        // Create form data
-        const formData = new FormData();
-        formData.append('quantity', quantity);
-
-        fetch(`/add_to_cart/${productId}`, {
-            method: 'POST',
-            body: formData
-        })
-        .then(response => {
-            if (response.ok) {
-                return response.text();
-            }
-            throw new Error('Failed to add item to cart');
-        })
-        .then(html => {
-            // Check if response contains success message
-            if (html.includes('added to cart') || html.includes('success')) {
+        this.sendChanges([{ product_id: productId, add: quantity }])
+        .then(result => {
+            this.setButtonLoading(button, false);
+            if (result.errors.length === 0) {
                 this.showCartNotification('Item added to cart!', 'success');
-                this.updateCartDisplay();
                 this.animateAddToCart(button);
-            } else {
-                this.showCartNotification('Unable to add item to cart', 'error');
             }
         })
         .catch(error => {
             console.error('Error:', error);
-            this.showCartNotification('Failed to add item to cart', 'error');
-        })
-        .finally(() => {
             this.setButtonLoading(button, false);
+            this.showCartNotification('Failed to add item to cart', 'error');
         });
     }
 
@@ -110,36 +153,14 @@ class CartManager {
     handleQuantityChange(input) {
         const productId = input.getAttribute('data-product-id');
         const quantity = parseInt(input.value);
-        const row = input.closest('tr') || input.closest('.cart-item');
 
+        if (isNaN(quantity)) return;
         if (quantity <= 0) {
             this.handleRemoveItem(input);
             return;
         }
 
-        // Update quantity via form submission
-        const form = input.closest('form');
-        if (form) {
-            const formData = new FormData(form);
-            
-            fetch('/update_cart', {
-                method: 'POST',
-                body: formData
-            })
-            .then(response => {
-                if (response.ok) {
-                    this.updateCartDisplay();
-                    this.updateRowTotal(row);
-                    this.showCartNotification('Cart updated!', 'success');
-                } else {
-                    throw new Error('Failed to update cart');
-                }
-            })
-            .catch(error => {
-                console.error('Error:', error);
-                this.showCartNotification('Failed to update cart', 'error');
-            });
-        }
+        this.queueChange(productId, quantity);
     }
 
     handleRemoveItem(button) {
@@ -151,16 +172,10 @@ class CartManager {
             row.style.opacity = '0.5';
             row.style.pointerEvents = 'none';
 
-            fetch(`/remove_from_cart/${productId}`)
-            .then(response => {
-                if (response.ok) {
-                    row.remove();
-                    this.updateCartDisplay();
-                    this.showCartNotification('Item removed from cart', 'info');
-                    this.checkEmptyCart();
-                } else {
-                    throw new Error('Failed to remove item');
-                }
+            this.pendingChanges.delete(productId);
+            this.sendChanges([{ product_id: productId, quantity: 0 }])
+            .then(() => {
+                this.showCartNotification('Item removed from cart', 'info');
             })
             .catch(error => {
                 console.error('Error:', error);
@@ -172,59 +187,53 @@ class CartManager {
         }
     }
 
-    updateRowTotal(row) {
-        const quantityInput = row.querySelector('.quantity-input');
-        const priceElement = row.querySelector('.item-price');
-        const totalElement = row.querySelector('.item-total');
-        
-        if (quantityInput && priceElement && totalElement) {
-            const quantity = parseInt(quantityInput.value);
-            const price = parseFloat(priceElement.textContent.replace('₹', ''));
-            const total = quantity * price;
-            
-            totalElement.textContent = `₹${total.toFixed(2)}`;
-        }
+    applyCartResult(result) {
+        // The server returns new totals and only the lines that changed
+        this.setCartCount(result.count);
+        this.updateCartTotal(result.total);
+
+        Object.entries(result.items).forEach(([productId, item]) => {
+            const row = document.querySelector(`.cart-item[data-product-id="${productId}"]`);
+            if (!row) return;
+            if (item.quantity === 0) {
+                row.remove();
+                return;
+            }
+            const quantityInput = row.querySelector('.quantity-input');
+            const totalElement = row.querySelector('.item-total');
+            if (quantityInput) quantityInput.value = item.quantity;
+            if (totalElement) totalElement.textContent = `₹${item.total.toFixed(2)}`;
+        });
+
+        result.errors.forEach(error => {
+            this.showCartNotification(error.error, 'error');
+        });
+        this.checkEmptyCart();
     }
 
-    updateCartDisplay() {
-        // This would typically fetch updated cart data from the server
-        // For now, we'll update the cart count in the navbar
-        this.updateCartCount();
-        this.updateCartTotal();
+    setCartCount(count) {
+        const cartBadge = document.querySelector('[data-cart-count]');
+        if (!cartBadge) return;
+
+        cartBadge.textContent = count;
+        cartBadge.hidden = count === 0;
     }
 
     updateCartCount() {
-        fetch('/cart')
-        .then(response => response.text())
-        .then(html => {
-            // Parse the response to extract cart count
-            const parser = new DOMParser();
-            const doc = parser.parseFromString(html, 'text/html');
-            const cartBadge = document.querySelector('.navbar .badge');
-            const newCartBadge = doc.querySelector('.navbar .badge');
-            
-            if (cartBadge && newCartBadge) {
-                cartBadge.textContent = newCartBadge.textContent;
-                cartBadge.style.display = newCartBadge.style.display;
-            }
-        })
+        fetch('/cart/summary')
+        .then(response => response.json())
+        .then(summary => this.setCartCount(summary.count))
         .catch(error => console.error('Error updating cart count:', error));
     }
 
-    updateCartTotal() {
-        const cartTotalElements = document.querySelectorAll('.cart-total');
-        if (cartTotalElements.length === 0) return;
-
-        // Calculate total from visible items
-        let total = 0;
-        document.querySelectorAll('.item-total').forEach(element => {
-            const value = parseFloat(element.textContent.replace('₹', ''));
-            total += value;
-        });
-
-        cartTotalElements.forEach(element => {
+    updateCartTotal(total) {
+        document.querySelectorAll('.cart-subtotal').forEach(element => {
             element.textContent = `₹${total.toFixed(2)}`;
         });
+        document.querySelectorAll('.cart-grand-total').forEach(element => {
+            const deliveryFee = parseFloat(element.getAttribute('data-delivery-fee')) || 0;
+            element.textContent = `₹${(total + deliveryFee).toFixed(2)}`;
+        });
     }
 
     checkEmptyCart() {
@@ -264,9 +273,14 @@ class CartManager {
     setButtonLoading(button, loading) {
         if (loading) {
             button.disabled = true;
+            button.dataset.originalHtml = button.innerHTML;
             button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Adding...';
         } else {
             button.disabled = false;
+            if (button.dataset.originalHtml) {
+                button.innerHTML = button.dataset.originalHtml;
+                delete button.dataset.originalHtml;
+            }
         }
     }
 
@@ -201,21 +201,27 @@
             }
         }
 
-        // Search functionality
+        // Search functionality: typeahead suggestions from /search/suggest
         initializeSearch() {
             const searchInputs = document.querySelectorAll('.search-input');
             searchInputs.forEach(input => {
-                let searchTimeout;
-
-                input.addEventListener('input', (e) => {
-                    clearTimeout(searchTimeout);
-                    searchTimeout = setTimeout(() => {
-                        this.performSearch(e.target.value, e.target);
-                    }, 300);
+                const search = this.debounce((value) => this.performSearch(value, input), 150);
+                input.addEventListener('input', (e) => search(e.target.value.trim()));
+                input.addEventListener('keydown', (e) => {
+                    if (e.key === 'Escape') this.hideSearchResults(input);
+                });
+                input.addEventListener('blur', () => {
+                    // Let a click on a suggestion land before hiding the list
+                    setTimeout(() => this.hideSearchResults(input), 200);
                 });
             });
         }
 
+        hideSearchResults(input) {
+            const resultsContainer = input.closest('.search-container')?.querySelector('.search-results');
+            if (resultsContainer) resultsContainer.style.display = 'none';
+        }
+
         performSearch(query, input) {
             const searchContainer = input.closest('.search-container');
             const resultsContainer = searchContainer?.querySelector('.search-results');
@@ -225,18 +231,37 @@
                 return;
             }
 
-            // Show loading
-            resultsContainer.innerHTML = '<div class="p-3"><i class="fas fa-spinner fa-spin"></i> Searching...</div>';
-            resultsContainer.style.display = 'block';
+            // Only the latest keystroke's response matters
+            if (this.searchRequest) this.searchRequest.abort();
+            this.searchRequest = new AbortController();
+
+            fetch(`/search/suggest?q=${encodeURIComponent(query)}`, { signal: this.searchRequest.signal })
+                .then(response => response.json())
+                .then(data => this.renderSuggestions(data, query, resultsContainer))
+                .catch(error => {
+                    if (error.name !== 'AbortError') resultsContainer.style.display = 'none';
+                });
+        }
 
-            // Simulate search (replace with actual search endpoint)
-            setTimeout(() => {
-                resultsContainer.innerHTML = `
-                    <div class="p-3">
-                        <div class="search-result-item">Sample result for "${query}"</div>
-                    </div>
-                `;
-            }, 500);
+        renderSuggestions(data, query, resultsContainer) {
+            const escape = (text) => {
+                const div = document.createElement('div');
+                div.textContent = text;
+                return div.innerHTML;
+            };
+            const items = [
+                ...data.categories.map(c => `<a class="search-result-item" href="${c.url}">
+                    <i class="fas fa-tags me-2 text-muted"></i>${escape(c.name)}</a>`),
+                ...data.products.map(p => `<a class="search-result-item" href="${p.url}">
+                    <i class="fas fa-cookie-bite me-2 text-muted"></i>${escape(p.name)}</a>`)
+            ];
+
+            if (!items.length) {
+                resultsContainer.innerHTML = `<div class="p-3 text-muted">No matches for "${escape(query)}"</div>`;
+            } else {
+                resultsContainer.innerHTML = items.join('');
+            }
+            resultsContainer.style.display = 'block';
         }
 
         // Form validation
@@ -0,0 +1,276 @@
+import os
+import uuid
+import pickle
+import sqlite3
+import logging
+import threading
+
+import persistence
+
+# Storage backends behind data_store. Every process keeps its own in-memory
+# mirror of the collections; a backend decides where committed rows live and,
+# for shared backends, feeds back changes committed by other processes.
+
+
+class StorageBackend:
+    """Interface between data_store and where its rows are kept"""
+
+    # True when other processes can commit to the same store
+    shared = False
+
+    def load(self, collection_names):
+        """Return the committed state as a persistence.empty_state() style dict"""
+        raise NotImplementedError
+
+    def next_id(self, counter_name, local_value):
+        """Allocate the next id for a counter"""
+        return local_value
+
+    def begin(self):
+        """Start a write transaction"""
+
+    def write(self, records):
+        """Write mutation records, inside the current transaction if one is open"""
+        raise NotImplementedError
+
+    def commit(self):
+        """Commit the current write transaction"""
+
+    def rollback(self):
+        """Abandon the current write transaction"""
+
+    def poll(self):
+        """Return records committed elsewhere since the last poll, or None if a full reload is needed"""
+        return []
+
+    def close(self):
+        """Release files and connections"""
+
+
+class MemoryBackend(StorageBackend):
+    """Process-local dict storage, optionally made durable with a mutation log"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.mutation_log = None
+
+    def load(self, collection_names):
+        if not self.directory:
+            return persistence.empty_state(collection_names)
+        state = persistence.load_state(self.directory, collection_names)
+        self.mutation_log = persistence.MutationLog(self.directory, collection_names,
+                                                    start_segment=state['segment'] + 1)
+        return state
+
+    def write(self, records):
+        if self.mutation_log is not None:
+            for record in records:
+                self.mutation_log.append(record)
+
+    def close(self):
+        if self.mutation_log is not None:
+            self.mutation_log.close()
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite (WAL mode) storage shared by every worker on the host.
+
+    Rows are stored pickled alongside a changes table; each worker tails the
+    changes table to keep its in-memory mirror current. Connections are opened
+    once per thread and reused, and sqlite3's statement cache keeps the fixed
+    queries below prepared.
+    """
+
+    shared = True
+
+    # Keep at least this many change rows for workers that fall behind
+    CHANGE_RETENTION = 100000
+    PRUNE_EVERY = 1000
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS rows (
+            collection TEXT NOT NULL,
+            key INTEGER NOT NULL,
+            value BLOB NOT NULL,
+            PRIMARY KEY (collection, key)
+        );
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            worker TEXT NOT NULL,
+            op TEXT NOT NULL,
+            collection TEXT NOT NULL,
+            key INTEGER NOT NULL
+        );
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._pid = None
+        self._worker_id = None
+        self._last_seq = 0
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+
+    @property
+    def worker_id(self):
+        if self._pid != os.getpid():
+            # Forked workers (gunicorn --preload) each need their own identity
+            self._pid = os.getpid()
+            self._worker_id = f'{self._pid}-{uuid.uuid4().hex[:8]}'
+        return self._worker_id
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.in_transaction = False
+            self._local.data_version = None
+        return conn
+
+    def load(self, collection_names):
+        conn = self._connection()
+        state = persistence.empty_state(collection_names)
+        conn.execute('BEGIN')
+        try:
+            (last_seq,) = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()
+            for collection, key, value in conn.execute('SELECT collection, key, value FROM rows'):
+                state['collections'].setdefault(collection, {})[key] = pickle.loads(value)
+            state['counters'].update(conn.execute('SELECT name, value FROM counters'))
+        finally:
+            conn.execute('COMMIT')
+        self._last_seq = last_seq
+        return state
+
+    def next_id(self, counter_name, local_value):
+        conn = self._connection()
+        own_transaction = not self._local.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)',
+                         (counter_name, local_value))
+            (value,) = conn.execute('SELECT value FROM counters WHERE name = ?',
+                                    (counter_name,)).fetchone()
+            conn.execute('UPDATE counters SET value = ? WHERE name = ?', (value + 1, counter_name))
+        except BaseException:
+            if own_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        if own_transaction:
+            conn.execute('COMMIT')
+        return value
+
+    def begin(self):
+        conn = self._connection()
+        # IMMEDIATE takes the database write lock up front, so the caller can
+        # sync and validate against state no other worker can change under it.
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.in_transaction = True
+
+    def commit(self):
+        self._local.in_transaction = False
+        self._connection().execute('COMMIT')
+
+    def rollback(self):
+        self._local.in_transaction = False
+        self._connection().execute('ROLLBACK')
+
+    def write(self, records):
+        if not records:
+            return
+        conn = self._connection()
+        own_transaction = not self._local.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+        try:
+            worker = self.worker_id
+            for op, collection, key, value in records:
+                if op == 'put':
+                    conn.execute('INSERT OR REPLACE INTO rows (collection, key, value) VALUES (?, ?, ?)',
+                                 (collection, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+                elif op == 'del':
+                    conn.execute('DELETE FROM rows WHERE collection = ? AND key = ?', (collection, key))
+                else:
+                    conn.execute('INSERT INTO counters (name, value) VALUES (?, ?) '
+                                 'ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)',
+                                 (key, value))
+                    continue
+                conn.execute('INSERT INTO changes (worker, op, collection, key) VALUES (?, ?, ?, ?)',
+                             (worker, op, collection, key))
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM changes WHERE seq < (SELECT MAX(seq) FROM changes) - ?',
+                             (self.CHANGE_RETENTION,))
+        except BaseException:
+            if own_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        if own_transaction:
+            conn.execute('COMMIT')
+
+    def poll(self):
+        conn = self._connection()
+        # data_version only changes when another connection commits, so the
+        # common no-change case costs a single pragma read.
+        (data_version,) = conn.execute('PRAGMA data_version').fetchone()
+        if data_version == self._local.data_version:
+            return []
+        self._local.data_version = data_version
+
+        rows = conn.execute(
+            'SELECT c.seq, c.worker, c.op, c.collection, c.key, r.value FROM changes c '
+            'LEFT JOIN rows r ON r.collection = c.collection AND r.key = c.key '
+            'WHERE c.seq > ? ORDER BY c.seq', (self._last_seq,)).fetchall()
+        if not rows:
+            return []
+        if rows[0][0] > self._last_seq + 1:
+            (min_seq,) = conn.execute('SELECT MIN(seq) FROM changes').fetchone()
+            if min_seq > self._last_seq + 1:
+                logging.info("Change feed was pruned past this worker's position; reloading")
+                return None
+
+        records = []
+        worker = self.worker_id
+        for seq, change_worker, op, collection, key, value in rows:
+            if change_worker == worker:
+                continue
+            if op == 'put':
+                if value is None:
+                    continue  # deleted again later in this batch
+                records.append(('put', collection, key, pickle.loads(value)))
+            else:
+                records.append(('del', collection, key, None))
+        self._last_seq = rows[-1][0]
+        return records
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_backend():
+    """Create the backend selected by STORAGE_BACKEND (memory or sqlite)"""
+    kind = os.environ.get('STORAGE_BACKEND', 'memory').lower()
+    data_dir = os.environ.get('DATA_DIR')
+    if kind == 'sqlite':
+        path = os.environ.get('SQLITE_PATH') or os.path.join(data_dir or 'data', 'store.db')
+        return SQLiteBackend(path)
+    if kind != 'memory':
+        raise ValueError(f"Unknown STORAGE_BACKEND: {kind}")
+    return MemoryBackend(data_dir)
@@ -1,22 +1,45 @@
-from flask import session
+from flask import session, g
 from flask_mail import Message
-from app import mail
+from app import mail_dispatcher
 from models import User, Product, Order, Review, CartItem
-from data_store import data_store
+from data_store import data_store, order_stats, product_search, product_suggest, get_category_by_name
+from search_index import tokenize
 import logging
 
 def get_current_user():
-    """Get current logged-in user"""
-    user_id = session.get('user_id')
-    if user_id:
-        return data_store['users'].get(user_id)
-    return None
+    """Get current logged-in user, looked up at most once per request"""
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = data_store['users'].get(user_id) if user_id else None
+    return g.current_user
 
 def get_cart():
-    """Get current user's cart"""
-    if 'cart' not in session:
-        session['cart'] = {}
-    return session['cart']
+    """Get current user's cart as {product id string: quantity}.
+
+    Only quantities are kept in the session; prices and names are looked up
+    when the cart is read. Reading doesn't create a cart, so the session
+    stays unchanged until something is added.
+    """
+    cart = session.get('cart', {})
+    # Carts saved before the compact encoding kept price and name per line
+    if any(isinstance(quantity, dict) for quantity in cart.values()):
+        cart = {product_id_str: item['quantity'] if isinstance(item, dict) else item
+                for product_id_str, item in cart.items()}
+    return cart
+
+def get_cart_lines():
+    """(product, quantity) for each cart line whose product still exists, at current prices"""
+    products = data_store['products']
+    lines = []
+    for product_id_str, quantity in get_cart().items():
+        product = products.get(int(product_id_str))
+        if product:
+            lines.append((product, quantity))
+    return lines
+
+def _save_cart(cart):
+    session['cart'] = cart
+    g.pop('cart_summary', None)
 
 def add_to_cart(product_id, quantity=1):
     """Add item to cart"""
@@ -30,16 +53,8 @@ def add_to_cart(product_id, quantity=1):
         return False
     
     product_id_str = str(product_id)
-    if product_id_str in cart:
-        cart[product_id_str]['quantity'] += quantity
-    else:
-        cart[product_id_str] = {
-            'quantity': quantity,
-            'price': product.price,
-            'name': product.name
-        }
-    
-    session['cart'] = cart
+    cart[product_id_str] = cart.get(product_id_str, 0) + quantity
+    _save_cart(cart)
     return True
 
 def remove_from_cart(product_id):
@@ -48,7 +63,7 @@ def remove_from_cart(product_id):
     product_id_str = str(product_id)
     if product_id_str in cart:
         del cart[product_id_str]
-        session['cart'] = cart
+        _save_cart(cart)
         return True
     return False
 
@@ -62,31 +77,80 @@ def update_cart_quantity(product_id, quantity):
         if quantity <= 0:
             del cart[product_id_str]
         else:
-            cart[product_id_str]['quantity'] = quantity
-        session['cart'] = cart
+            cart[product_id_str] = quantity
+        _save_cart(cart)
         return True
     return False
 
+def apply_cart_changes(changes):
+    """Apply a batch of cart changes, checking each against stock, with one session write.
+
+    Each change is {'product_id': id, 'quantity': n} to set a quantity (0
+    removes the item) or {'product_id': id, 'add': n} to add to it. Returns
+    the new quantity of every product changed, and a list of rejected changes.
+    """
+    cart = get_cart()
+    updated = {}
+    errors = []
+    for change in changes:
+        try:
+            product_id = int(change['product_id'])
+            product_id_str = str(product_id)
+            current = cart.get(product_id_str, 0)
+            quantity = current + int(change['add']) if 'add' in change else int(change['quantity'])
+        except (KeyError, TypeError, ValueError):
+            errors.append({'change': change, 'error': 'Invalid change'})
+            continue
+
+        product = data_store['products'].get(product_id)
+        if quantity < 0:
+            errors.append({'product_id': product_id, 'error': 'Quantity cannot be negative'})
+            continue
+        if quantity > 0 and not product:
+            errors.append({'product_id': product_id, 'error': 'Product not available'})
+            continue
+        if quantity > 0 and product.stock < quantity:
+            errors.append({'product_id': product_id, 'error': f'Only {product.stock} in stock'})
+            continue
+
+        if quantity == 0:
+            cart.pop(product_id_str, None)
+        else:
+            cart[product_id_str] = quantity
+        updated[product_id] = quantity
+
+    if updated:
+        _save_cart(cart)
+    return updated, errors
+
+def _cart_summary():
+    # (item count, total) computed in one pass at current prices and memoized
+    # for the request; cart writes drop the memo
+    summary = g.get('cart_summary')
+    if summary is None:
+        count = 0
+        total = 0
+        for product, quantity in get_cart_lines():
+            count += quantity
+            total += quantity * product.price
+        summary = g.cart_summary = (count, total)
+    return summary
+
 def get_cart_total():
     """Calculate cart total"""
-    cart = get_cart()
-    total = 0
-    for item in cart.values():
-        total += item['quantity'] * item['price']
-    return total
+    return _cart_summary()[1]
 
 def get_cart_count():
     """Get total items in cart"""
-    cart = get_cart()
-    return sum(item['quantity'] for item in cart.values())
+    return _cart_summary()[0]
 
 def clear_cart():
     """Clear the cart"""
-    session['cart'] = {}
-    session.modified = True
+    session.pop('cart', None)
+    g.pop('cart_summary', None)
 
 def send_order_confirmation_email(user_email, order):
-    """Send order confirmation email"""
+    """Queue order confirmation email for the background mail dispatcher"""
     try:
         msg = Message(
             subject=f'Order Confirmation - #{order.id}',
@@ -112,39 +176,42 @@ Best regards,
 The NIKITA RASOI & BAKES Team
             '''
         )
-        mail.send(msg)
-        logging.info(f"Order confirmation email sent to {user_email}")
+        mail_dispatcher.enqueue(msg)
+        logging.info(f"Order confirmation email queued for {user_email}")
         return True
     except Exception as e:
-        logging.error(f"Failed to send email: {str(e)}")
+        logging.error(f"Failed to queue email: {str(e)}")
         return False
 
 def calculate_order_stats():
-    """Calculate order statistics for admin dashboard"""
-    orders = list(data_store['orders'].values())
-    
-    total_orders = len(orders)
-    total_revenue = sum(order.total for order in orders)
-    
-    pending_orders = len([o for o in orders if o.status == 'pending'])
-    completed_orders = len([o for o in orders if o.status == 'delivered'])
-    
-    return {
-        'total_orders': total_orders,
-        'total_revenue': total_revenue,
-        'pending_orders': pending_orders,
-        'completed_orders': completed_orders
-    }
+    """Order statistics for the admin dashboard, read from the running totals"""
+    return order_stats.summary()
 
 def search_products(query, category=None):
-    """Search products by name and optionally filter by category"""
-    products = list(data_store['products'].values())
+    """Search products by name, category and description (best match first) and optionally filter by category"""
+    if query:
+        products = [data_store['products'][product_id] for product_id in product_search.search(query)]
+    else:
+        products = list(data_store['products'].values())
     
     if category and category != 'all':
-        products = [p for p in products if p.category.lower() == category.lower()]
+        selected = get_category_by_name(category)
+        category_id = selected.id if selected else None
+        products = [p for p in products if p.category_id == category_id]
     
-    if query:
-        query = query.lower()
-        products = [p for p in products if query in p.name.lower() or query in p.description.lower()]
+    return products
+
+def get_search_suggestions(query, limit=8):
+    """Typeahead suggestions: the most reviewed matching products and matching active categories"""
+    products = [data_store['products'][product_id] for product_id in product_suggest.suggest(query, limit)]
+    
+    # Categories are few enough to match directly, which also respects is_active
+    tokens = tokenize(query)
+    categories = []
+    if tokens:
+        for category in data_store['categories'].values():
+            words = tokenize(category.name)
+            if category.is_active and all(any(w.startswith(t) for w in words) for t in tokens):
+                categories.append(category)
     
-    return list(products)
+    return products, categories[:3]
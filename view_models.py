@@ -0,0 +1,82 @@
+from data_store import data_store
+
+# Flat rows for templates. A view builds each join here once, with one dict
+# lookup per related row, so templates never scan data_store themselves and
+# rendering stays linear in the rows shown. Rows referring to deleted users or
+# products still render, with a placeholder name.
+
+UNKNOWN_PRODUCT = 'Unknown Product'
+DELETED_USER = 'Deleted user'
+
+
+class OrderItemRow:
+    __slots__ = ('product_id', 'name', 'image_url', 'category_name', 'quantity', 'price', 'total', 'available')
+
+    def __init__(self, item, product):
+        self.product_id = item.product_id
+        self.quantity = item.quantity
+        self.price = item.price
+        self.total = item.quantity * item.price
+        self.available = product is not None
+        if product is not None:
+            self.name = product.name
+            self.image_url = product.image_url
+            self.category_name = product.category_name
+        else:
+            self.name = UNKNOWN_PRODUCT
+            self.image_url = ''
+            self.category_name = ''
+
+
+class OrderRow:
+    __slots__ = ('id', 'user_id', 'customer_name', 'customer_email', 'total', 'status', 'shipping_address',
+                 'payment_method', 'created_at', 'updated_at', 'items')
+
+    def __init__(self, order, customer, items):
+        self.id = order.id
+        self.user_id = order.user_id
+        self.customer_name = customer.username if customer else DELETED_USER
+        self.customer_email = customer.email if customer else ''
+        self.total = order.total
+        self.status = order.status
+        self.shipping_address = order.shipping_address
+        self.payment_method = order.payment_method
+        self.created_at = order.created_at
+        self.updated_at = order.updated_at
+        self.items = items
+
+
+class ReviewRow:
+    __slots__ = ('id', 'product_id', 'author', 'rating', 'comment', 'created_at')
+
+    def __init__(self, review, author):
+        self.id = review.id
+        self.product_id = review.product_id
+        self.author = author.username if author else DELETED_USER
+        self.rating = review.rating
+        self.comment = review.comment
+        self.created_at = review.created_at
+
+
+def order_item_rows(order):
+    """An order's line items joined to their products"""
+    products = data_store['products']
+    return [OrderItemRow(item, products.get(item.product_id)) for item in order.items]
+
+
+def order_rows(orders, with_items=True):
+    """Orders joined to their customers and, unless with_items is False, their products"""
+    users = data_store['users']
+    return [OrderRow(order, users.get(order.user_id), order_item_rows(order) if with_items else ())
+            for order in orders]
+
+
+def review_rows(reviews):
+    """Reviews joined to their authors"""
+    users = data_store['users']
+    return [ReviewRow(review, users.get(review.user_id)) for review in reviews]
+
+
+def store_counts():
+    """Row counts for the admin system overview"""
+    return {table: len(data_store[table]) for table in ('products', 'users', 'reviews', 'addresses')}
@@ -0,0 +1,198 @@
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import deque
+from datetime import date, timedelta
+
+
+class HyperLogLog:
+    """Fixed-size cardinality sketch (about 1.6% standard error at p=12)"""
+
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+        self.alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+    def add(self, value):
+        h = self._hash(value)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        estimate = self.alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            return int(round(self.m * math.log(self.m / zeros)))
+        return int(round(estimate))
+
+
+class UniqueCounter:
+    """Counts distinct values exactly up to a threshold, then switches to HyperLogLog"""
+
+    def __init__(self, exact_limit=10000):
+        self.exact_limit = exact_limit
+        self.values = set()
+        self.sketch = None
+
+    def add(self, value):
+        if self.sketch is not None:
+            self.sketch.add(value)
+            return
+        self.values.add(value)
+        if len(self.values) > self.exact_limit:
+            self.sketch = HyperLogLog()
+            for seen in self.values:
+                self.sketch.add(seen)
+            self.values = None
+
+    def count(self):
+        if self.sketch is not None:
+            return self.sketch.count()
+        return len(self.values)
+
+
+class DayBucket:
+    def __init__(self, exact_limit):
+        self.visitors = UniqueCounter(exact_limit)
+        self.endpoint_hits = {}
+
+
+class VisitorStats:
+    """Per-day unique visitor sketches and endpoint hit counters.
+
+    Only the last retention_days days are kept, so memory is bounded by
+    retention_days * (exact_limit addresses + sketch + endpoints) no matter
+    how much traffic arrives.
+    """
+
+    def __init__(self, retention_days=30, exact_limit=10000):
+        self.retention_days = retention_days
+        self.exact_limit = exact_limit
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def record(self, ip_address, endpoint=None, day=None):
+        """Count one request from ip_address to endpoint"""
+        day = day or date.today()
+        with self._lock:
+            bucket = self._buckets.get(day)
+            if bucket is None:
+                bucket = self._buckets[day] = DayBucket(self.exact_limit)
+                self._expire(day)
+            bucket.visitors.add(ip_address or '')
+            bucket.endpoint_hits[endpoint] = bucket.endpoint_hits.get(endpoint, 0) + 1
+
+    def record_batch(self, visits, day=None):
+        """Count a batch of (ip_address, endpoint) visits under one lock acquisition"""
+        day = day or date.today()
+        with self._lock:
+            bucket = self._buckets.get(day)
+            if bucket is None:
+                bucket = self._buckets[day] = DayBucket(self.exact_limit)
+                self._expire(day)
+            add_visitor = bucket.visitors.add
+            hits = bucket.endpoint_hits
+            for ip_address, endpoint in visits:
+                add_visitor(ip_address or '')
+                hits[endpoint] = hits.get(endpoint, 0) + 1
+
+    def _expire(self, today):
+        cutoff = today - timedelta(days=self.retention_days)
+        for day in [d for d in self._buckets if d <= cutoff]:
+            del self._buckets[day]
+
+    def days(self):
+        """Days with recorded visits, oldest first"""
+        with self._lock:
+            return sorted(self._buckets)
+
+    def unique_visitors(self, day):
+        """Number of distinct visitors on a day"""
+        with self._lock:
+            bucket = self._buckets.get(day)
+            return bucket.visitors.count() if bucket else 0
+
+    def endpoint_hits(self, day):
+        """Copy of the endpoint -> hit count map for a day"""
+        with self._lock:
+            bucket = self._buckets.get(day)
+            return dict(bucket.endpoint_hits) if bucket else {}
+
+
+class VisitorLogPipeline:
+    """Bounded hand-off queue between the request hook and VisitorStats.
+
+    submit() appends a bare (ip, endpoint) tuple to a deque, which is atomic
+    under the GIL, so the request path takes no lock. A daemon thread drains
+    the queue every flush_interval seconds and records the batch under a
+    single VisitorStats lock. When the queue is full new entries are dropped
+    and counted rather than slowing requests down; the counters are updated
+    without a lock and may undercount slightly under contention.
+    """
+
+    def __init__(self, stats, max_queue=100000, flush_interval=0.5):
+        self.stats = stats
+        self.max_queue = max_queue
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.flushed = 0
+        self.batches = 0
+        self._queue = deque()
+        self._thread = None
+        self.start()
+        os.register_at_fork(after_in_child=self.start)
+
+    def start(self):
+        """Start (or, after a fork, restart) the flusher thread"""
+        self._thread = threading.Thread(target=self._run, name='visitor-log-flusher', daemon=True)
+        self._thread.start()
+
+    def submit(self, ip_address, endpoint):
+        """Queue one visit; never blocks"""
+        if len(self._queue) >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.append((ip_address, endpoint))
+
+    def flush(self):
+        """Record every queued visit now"""
+        queue = self._queue
+        batch = []
+        try:
+            while True:
+                batch.append(queue.popleft())
+        except IndexError:
+            pass
+        if batch:
+            self.stats.record_batch(batch)
+            self.flushed += len(batch)
+            self.batches += 1
+
+    def get_counters(self):
+        """Queue depth and flush/drop counters"""
+        return {
+            'queued': len(self._queue),
+            'flushed': self.flushed,
+            'dropped': self.dropped,
+            'batches': self.batches
+        }
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.warning(f"Failed to flush visitor logs: {e}")